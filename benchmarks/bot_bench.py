@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+
+from collections import defaultdict
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from fakes import FakeBotAPI, FakeCoinCap
+
+SCENARIOS = ["price", "chart", "review", "search", "paging", "alarmed_review"]
+TOKEN = "123456:bench"
+
+
+class Driver:
+    def __init__(self, app, coins: list):
+        self.app, self.coins = app, coins
+        self.update_id = 0
+
+    def next_id(self) -> int:
+        self.update_id += 1
+        return self.update_id
+
+    async def callback(self, user_id: int, data: str):
+        update_id = self.next_id()
+        await self.process({"update_id": update_id,
+                            "callback_query": {"id": str(update_id), "from": get_user(user_id),
+                                               "chat_instance": str(user_id), "data": data,
+                                               "message": {"message_id": update_id, "date": int(time.time()),
+                                                           "chat": get_chat(user_id), "text": "Select option 💬"}}})
+
+    async def message(self, user_id: int, text: str):
+        update_id = self.next_id()
+        await self.process({"update_id": update_id,
+                            "message": {"message_id": update_id, "date": int(time.time()), "from": get_user(user_id),
+                                        "chat": get_chat(user_id), "text": text}})
+
+    async def process(self, data: dict):
+        from telegram import Update
+        await self.app.process_update(Update.de_json(data, self.app.bot))
+
+    async def price(self, user_id: int, rng: random.Random):
+        await self.callback(user_id, f"price_{rng.choice(self.coins)}")
+
+    async def chart(self, user_id: int, rng: random.Random):
+        from crypto import RANGES
+        await self.callback(user_id, f"chart_{rng.choice(list(RANGES))}_{rng.choice(self.coins)}")
+
+    async def review(self, user_id: int, rng: random.Random):
+        await self.callback(user_id, "review")
+
+    async def search(self, user_id: int, rng: random.Random):
+        await self.callback(user_id, "search")
+        await self.message(user_id, rng.choice(["$BTC", "$btc", "$bitcoin", "$bitcon"]))
+
+    async def paging(self, user_id: int, rng: random.Random):
+        start = rng.randrange(0, 1024 // 11) * 11
+        await self.callback(user_id, f"{rng.choice(['price', 'chart', 'favorites-add'])}#{start}-{start + 11}")
+
+
+def get_user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": "Bench"}
+
+
+def get_chat(user_id: int) -> dict:
+    return {"id": user_id, "type": "private"}
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[max(0, math.ceil(len(values) * q) - 1)] if values else float("nan")
+
+
+def summarize(values: list, elapsed: float) -> dict:
+    return {"count": len(values),
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "throughput_s": len(values) / elapsed if elapsed else float("nan")}
+
+
+async def run(args, coincap: FakeCoinCap, bot_api: FakeBotAPI, bot_url: str) -> dict:
+    import bot
+    import crypto
+    import sender
+    from database import Alarms, Favorites
+    from telegram.ext import ApplicationBuilder
+
+    bot.create_db()
+    errors = []
+
+    async def on_error(update, context):
+        errors.append(repr(context.error))
+
+    app = bot.build_app(ApplicationBuilder().token(TOKEN).base_url(f"{bot_url}/bot"))
+    app.add_error_handler(on_error)
+    await app.initialize()
+    await bot.startup(app)
+
+    market = await crypto.get_data()
+    driver = Driver(app, market.ids[:args.coins])
+    users = range(1, args.users + 1)
+    for user_id in users:
+        for coin_id in random.Random(user_id).sample(driver.coins, k=min(5, len(driver.coins))):
+            await Favorites.add_async(user_id, coin_id)
+        await Alarms.add(user_id, user_id, 8)
+
+    latencies = defaultdict(list)
+    scenarios = [scenario for scenario in args.scenarios if scenario != "alarmed_review"]
+
+    async def session(user_id: int):
+        rng = random.Random(user_id)
+        for _ in range(args.iterations):
+            for scenario in scenarios:
+                started = time.perf_counter()
+                await getattr(driver, scenario)(user_id, rng)
+                latencies[scenario].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(user_id) for user_id in users))
+    elapsed = time.perf_counter() - started
+
+    results = {scenario: summarize(latencies[scenario], elapsed) for scenario in scenarios}
+    results["all"] = summarize([value for values in latencies.values() for value in values], elapsed)
+
+    if "alarmed_review" in args.scenarios:
+        started = time.perf_counter()
+        await bot.alarmed_review(SimpleNamespace(job=SimpleNamespace(data=8), bot=app.bot))
+        queued = time.perf_counter() - started
+        await sender.queue.join()
+        results["alarmed_review"] = {"count": len(users), "p50_ms": queued * 1000, "p95_ms": queued * 1000,
+                                     "p99_ms": queued * 1000,
+                                     "throughput_s": len(users) / (time.perf_counter() - started)}
+
+    await app.shutdown()
+    await bot.shutdown(app)
+
+    return {"scenarios": results, "errors": errors,
+            "coincap_calls": dict(coincap.calls), "telegram_calls": dict(bot_api.calls),
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def report(result: dict):
+    columns = ["count", "p50_ms", "p95_ms", "p99_ms", "throughput_s"]
+    print(f"{'scenario':>16}" + "".join(f"{column:>14}" for column in columns))
+    for scenario, values in result["scenarios"].items():
+        print(f"{scenario:>16}" + "".join(f"{values[column]:>14.1f}" if isinstance(values[column], float)
+                                          else f"{values[column]:>14}" for column in columns))
+    print(f"\nCoinCap calls:  {result['coincap_calls']}")
+    print(f"Telegram calls: {result['telegram_calls']}")
+    print(f"Peak RSS:       {result['peak_rss_mb']:.1f} MB (bot process, chart workers not included)")
+    if result["errors"]:
+        print(f"Errors:         {len(result['errors'])}, first: {result['errors'][0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the bot handlers against fake CoinCap and Bot API servers")
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--iterations", type=int, default=5, help="scenario rounds per user")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--coins", type=int, default=20, help="top coins the users pick from")
+    parser.add_argument("--upstream-latency", type=float, default=0.0, help="added latency of fake servers in ms")
+    parser.add_argument("--engine", default="raster", help="CHART_ENGINE used for the run")
+    parser.add_argument("--send-rate", type=float, default=1000, help="SEND_RATE of the review queue")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    coincap, bot_api = FakeCoinCap(args.upstream_latency / 1000), FakeBotAPI(args.upstream_latency / 1000)
+    directory = tempfile.mkdtemp(prefix="cryptifica-bench-")
+    os.environ.update(COINCAP_URL=f"{coincap.start()}/v2", DATABASE_URL=f"sqlite:///{directory}/bench.db",
+                      BOT_TOKEN=TOKEN, CHART_ENGINE=args.engine, CHART_PREWARM="0", SEND_RATE=str(args.send_rate))
+    bot_url = bot_api.start()
+
+    try:
+        result = asyncio.run(run(args, coincap, bot_api, bot_url))
+    finally:
+        coincap.stop()
+        bot_api.stop()
+
+    report(result)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(result, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
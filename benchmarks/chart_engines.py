@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import math
+import argparse
+import resource
+import statistics
+import subprocess
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+ENGINES = ["plotly", "raster"]
+
+
+def make_history(points: int = 360):
+    random = np.random.default_rng(0)
+    dates = np.datetime64('2023-06-01', 'ms') + np.arange(points) * np.timedelta64(2, 'h')
+    prices = 27000.0 * np.cumprod(1 + random.normal(0, 0.005, points))
+    return dates, prices
+
+
+def run(engine: str, renders: int) -> dict:
+    started = time.perf_counter()
+    import renderer
+    module = renderer.get_engine(engine)
+    imported = time.perf_counter()
+    module.warm_up()
+    warmed = time.perf_counter()
+
+    dates, prices = make_history()
+    timings, size = [], 0
+    for _ in range(renders):
+        start = time.perf_counter()
+        size = len(module.get_chart(dates, prices, in_memory=True))
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {"engine": engine,
+            "import_ms": (imported - started) * 1000,
+            "warm_up_ms": (warmed - imported) * 1000,
+            "mean_ms": statistics.mean(timings),
+            "p50_ms": timings[len(timings) // 2],
+            "p95_ms": timings[min(len(timings) - 1, math.ceil(len(timings) * 0.95) - 1)],
+            "bytes": size,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chart rendering engines side by side")
+    parser.add_argument("--engine", choices=ENGINES)
+    parser.add_argument("--renders", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.engine:
+        print(json.dumps(run(args.engine, args.renders)))
+        return
+
+    columns = ["engine", "import_ms", "warm_up_ms", "mean_ms", "p50_ms", "p95_ms", "bytes", "peak_rss_mb"]
+    print("".join(f"{column:>14}" for column in columns))
+    for engine in ENGINES:
+        output = subprocess.run([sys.executable, __file__, "--engine", engine, "--renders", str(args.renders)],
+                                capture_output=True, text=True)
+        if output.returncode:
+            print(f"{engine:>14}  failed: {output.stderr.strip().splitlines()[-1]}")
+            continue
+        result = json.loads(output.stdout)
+        print("".join(f"{result[column]:>14.1f}" if isinstance(result[column], float) else f"{result[column]:>14}"
+                      for column in columns))
+    print("\npeak_rss_mb is the benchmark process only, kaleido's Chromium runs as a separate process")
+
+
+if __name__ == "__main__":
+    main()
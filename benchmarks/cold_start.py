@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import importlib
+import resource
+import statistics
+import subprocess
+import tempfile
+
+from fakes import FakeBotAPI, FakeCoinCap
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src')
+MODES = ["lazy", "warm-up", "eager"]
+STACK = ["numpy", "pandas", "plotly", "kaleido", "PIL"]
+
+
+async def run_startup_jobs(bot):
+    import renderer
+    app = bot.build_app(alarms=False)
+    await app.initialize()
+    await bot.startup(app)
+    for job in app.job_queue.jobs():
+        await job.run(app)
+    if renderer.pool is not None:
+        await asyncio.wrap_future(renderer.get_pool().submit(os.getpid))
+    await app.shutdown()
+    await bot.shutdown(app)
+
+
+def run(mode: str, engine: str) -> dict:
+    sys.path.insert(0, SRC)
+    started = time.perf_counter()
+    import bot
+    imported = time.perf_counter()
+
+    if mode == "eager":
+        import renderer
+        importlib.import_module("history")
+        renderer.get_engine(engine)
+    bot.create_db()
+    asyncio.run(run_startup_jobs(bot))
+    loaded = time.perf_counter()
+
+    return {"mode": mode,
+            "import_ms": (imported - started) * 1000,
+            "ready_ms": (loaded - started) * 1000,
+            "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "stack": ",".join(module for module in STACK if module in sys.modules) or "-"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bot import time and memory with and without the chart stack")
+    parser.add_argument("--mode", choices=MODES)
+    parser.add_argument("--engine", choices=["plotly", "raster"], default="plotly")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run(args.mode, args.engine)))
+        return
+
+    coincap, bot_api = FakeCoinCap(), FakeBotAPI()
+    env = dict(os.environ, CHART_ENGINE=args.engine, CHART_WORKERS="1", BOT_TOKEN="123456:cold-start",
+               COINCAP_URL=f"{coincap.start()}/v2", BOT_API_URL=f"{bot_api.start()}/bot",
+               DATABASE_URL=os.environ.get("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/cold_start.db"))
+    columns = ["mode", "import_ms", "ready_ms", "rss_mb", "stack"]
+    print("".join(f"{column:>14}" for column in columns[:-1]) + "  stack")
+    for mode in MODES:
+        mode_env = dict(env, CHART_WARM_UP=str(int(mode == "warm-up")))
+        results = []
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, __file__, "--mode", mode, "--engine", args.engine],
+                                    capture_output=True, text=True, env=mode_env)
+            if output.returncode:
+                print(f"{mode:>14}  failed: {output.stderr.strip().splitlines()[-1]}")
+                break
+            results.append(json.loads(output.stdout))
+        if len(results) < args.runs:
+            continue
+        print("".join(f"{statistics.median(r[column] for r in results):>14.1f}" if column != "mode"
+                      else f"{mode:>14}" for column in columns[:-1]) + f"  {results[-1]['stack']}")
+    coincap.stop()
+    bot_api.stop()
+    print("\nmedians of --runs fresh interpreters after the startup jobs ran, "
+          "rss_mb is the bot process only, chart workers are separate processes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import json
+import random
+import asyncio
+import argparse
+
+import websockets
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the CoinCap WebSocket price feed")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--assets", default="bitcoin,ethereum,tether,binance-coin,xrp")
+    parser.add_argument("--rate", type=float, default=5, help="price messages per second")
+    parser.add_argument("--drop-after", type=float, default=0, help="close every connection after N seconds")
+    args = parser.parse_args()
+
+    prices = {asset: random.uniform(1, 30000) for asset in args.assets.split(",")}
+
+    async def feed(socket):
+        started = asyncio.get_running_loop().time()
+        try:
+            while not args.drop_after or asyncio.get_running_loop().time() - started < args.drop_after:
+                changed = random.sample(list(prices), k=random.randint(1, len(prices)))
+                for asset in changed:
+                    prices[asset] *= 1 + random.gauss(0, 0.001)
+                await socket.send(json.dumps({asset: f"{prices[asset]:.8f}" for asset in changed}))
+                await asyncio.sleep(1 / args.rate)
+        except websockets.ConnectionClosed:
+            pass
+
+    async with websockets.serve(feed, args.host, args.port):
+        print(f"Serving fake price feed on ws://{args.host}:{args.port}/prices")
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
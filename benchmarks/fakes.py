@@ -0,0 +1,193 @@
+import os
+import re
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.parse
+import urllib.request
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAYLOADS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "payloads")
+COINCAP_URL = "https://api.coincap.io/v2"
+INTERVALS = {"m5": 5 * 60 * 1000, "h1": 60 * 60 * 1000, "h2": 2 * 60 * 60 * 1000, "d1": 24 * 60 * 60 * 1000}
+
+
+class FakeServer:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.respond()
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self.respond()
+
+            def respond(self):
+                url = urllib.parse.urlsplit(self.path)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                status, payload = fake.handle(url.path, dict(urllib.parse.parse_qsl(url.query)))
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def count(self, name: str):
+        with self.lock:
+            self.calls[name] += 1
+
+    def handle(self, path: str, params: dict):
+        raise NotImplementedError
+
+
+class FakeCoinCap(FakeServer):
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self.assets = load_assets()
+        self.by_id = {asset['id']: asset for asset in self.assets}
+        self.histories = {}
+
+    def handle(self, path: str, params: dict):
+        parts = path.strip("/").split("/")[1:]
+        if parts == ["assets"]:
+            self.count("assets")
+            return 200, {"data": self.assets[:int(params.get("limit", 100))], "timestamp": now()}
+        if len(parts) == 2 and parts[0] == "assets" and parts[1] in self.by_id:
+            self.count("asset")
+            return 200, {"data": self.by_id[parts[1]], "timestamp": now()}
+        if len(parts) == 3 and parts[0] == "assets" and parts[2] == "history" and parts[1] in self.by_id:
+            self.count("history")
+            points = self.get_history(parts[1], params.get("interval", "d1"))
+            if "start" in params and "end" in params:
+                points = [p for p in points if int(params["start"]) <= p["time"] <= int(params["end"])]
+            return 200, {"data": points, "timestamp": now()}
+        self.count("not_found")
+        return 404, {"error": f"{path} not found"}
+
+    def get_history(self, coin_id: str, interval: str) -> list:
+        if (coin_id, interval) not in self.histories:
+            self.histories[coin_id, interval] = load_history(coin_id, float(self.by_id[coin_id]["priceUsd"]),
+                                                             interval)
+        return self.histories[coin_id, interval]
+
+
+class FakeBotAPI(FakeServer):
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self.message_id = 0
+
+    def handle(self, path: str, params: dict):
+        method = path.rsplit("/", 1)[-1]
+        self.count(method)
+        if method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Cryptifica",
+                                                "username": "cryptifica_bot"}}
+        if method in ("answerCallbackQuery", "deleteMessage"):
+            return 200, {"ok": True, "result": True}
+        if method in ("sendMessage", "editMessageText", "sendPhoto", "editMessageMedia"):
+            return 200, {"ok": True, "result": self.message(photo=method in ("sendPhoto", "editMessageMedia"))}
+        return 200, {"ok": True, "result": True}
+
+    def message(self, photo: bool) -> dict:
+        with self.lock:
+            self.message_id += 1
+            message = {"message_id": self.message_id, "date": int(time.time()),
+                       "chat": {"id": 1, "type": "private"}}
+        if photo:
+            message["photo"] = [{"file_id": f"photo-{self.message_id}", "file_unique_id": str(self.message_id),
+                                 "width": 1280, "height": 720}]
+        else:
+            message["text"] = "ok"
+        return message
+
+
+def now() -> int:
+    return int(time.time() * 1000)
+
+
+def load_assets() -> list:
+    path = os.path.join(PAYLOADS, "assets.json")
+    if os.path.isfile(path):
+        with open(path) as file:
+            return json.load(file)["data"]
+
+    random.seed(0)
+    assets = []
+    for rank in range(1, 1025):
+        price = 30000 / rank ** 1.5 * random.uniform(0.5, 1.5)
+        name = "".join(random.choices("abcdefghijklmnopqrstuvwxyz", k=random.randint(4, 10)))
+        assets.append({"id": "bitcoin" if rank == 1 else f"{name}-{rank}", "rank": str(rank),
+                       "symbol": "BTC" if rank == 1 else name[:4].upper(),
+                       "name": "Bitcoin" if rank == 1 else name.title(),
+                       "supply": "19000000.0", "maxSupply": None,
+                       "marketCapUsd": str(price * 19000000), "volumeUsd24Hr": str(price * 100000),
+                       "priceUsd": f"{price:.16f}", "changePercent24Hr": f"{random.gauss(0, 3):.16f}",
+                       "vwap24Hr": f"{price:.16f}", "explorer": None})
+    return assets
+
+
+def load_history(coin_id: str, price: float, interval: str) -> list:
+    path = os.path.join(PAYLOADS, "history", coin_id, f"{interval}.json")
+    if os.path.isfile(path):
+        with open(path) as file:
+            return json.load(file)["data"]
+
+    random.seed(f"{coin_id}-{interval}")
+    step = INTERVALS[interval]
+    end = now() // step * step
+    points = []
+    for i in range(400, 0, -1):
+        price *= 1 + random.gauss(0, 0.005)
+        time_ms = end - i * step
+        points.append({"priceUsd": f"{price:.16f}", "time": time_ms,
+                       "date": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(time_ms / 1000))})
+    return points
+
+
+def record(coin_ids: list):
+    os.makedirs(PAYLOADS, exist_ok=True)
+    with urllib.request.urlopen(f"{COINCAP_URL}/assets?limit=1024") as response, \
+            open(os.path.join(PAYLOADS, "assets.json"), "wb") as file:
+        file.write(response.read())
+    for coin_id in coin_ids:
+        os.makedirs(os.path.join(PAYLOADS, "history", coin_id), exist_ok=True)
+        for interval in ("m5", "h1", "d1"):
+            with urllib.request.urlopen(f"{COINCAP_URL}/assets/{coin_id}/history?interval={interval}") as response, \
+                    open(os.path.join(PAYLOADS, "history", coin_id, f"{interval}.json"), "wb") as file:
+                file.write(response.read())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record CoinCap payloads replayed by the fake CoinCap server")
+    parser.add_argument("--coins", default="bitcoin,ethereum,tether")
+    args = parser.parse_args()
+    record([coin_id for coin_id in re.split(r"[,\s]+", args.coins) if coin_id])
@@ -1,17 +1,45 @@
 import os
+import html
+import asyncio
+import logging
 import datetime
 
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from collections import Counter
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, Update
 from telegram.ext import ApplicationBuilder, CallbackQueryHandler, CommandHandler, MessageHandler, ContextTypes, filters
 
 from telegram.constants import ParseMode
 from telegram.error import BadRequest
 
-from crypto import get_data, get_prices
-from chart import get_chart
-from database import Favorites
+from crypto import DEFAULT_RANGE, RANGES, get_data, close_client, format_price
+import charts
+import keyboards
+import metrics
+import search as search_index
+import renderer
+import sender
+from database import AlarmRuns, Alarms, Favorites, async_engine, connect_async
 
 from database import create_db
+from stream import PRICE_STREAM, stream
+from keyboards import get_page, parse_page
+from persistence import DatabasePersistence
+from updates import UNBOUNDED, ConcurrentApplication
+
+ALARM_HOURS = (0, 8, 12, 20)
+SEARCH_RESULTS = 8
+EDIT_IN_PLACE = os.environ.get("EDIT_IN_PLACE", "1") == "1"
+BOT_API_URL = os.environ.get("BOT_API_URL", "https://api.telegram.org/bot")
+ADMIN_IDS = {int(user_id) for user_id in os.environ.get("ADMIN_IDS", "").split(",") if user_id.strip()}
+METRICS_INTERVAL = int(os.environ.get("METRICS_INTERVAL", 15))
+STATS_LENGTH = 4000
+
+logger = logging.getLogger(__name__)
+transitions = Counter()
+for kind in ("edit", "resend"):
+    metrics.gauge("transitions_total", lambda kind=kind: transitions[kind], kind=kind)
+    metrics.gauge("transition_calls_total", lambda kind=kind: transitions[f"{kind}_calls"], kind=kind)
 
 MENU_KEYBOARD = [
     [InlineKeyboardButton("💰 Price", callback_data="price#0-11"),
@@ -24,33 +52,76 @@ MENU_KEYBOARD = [
 ]
 
 
+def get_markup(keyboard) -> InlineKeyboardMarkup:
+    return keyboard if isinstance(keyboard, InlineKeyboardMarkup) else InlineKeyboardMarkup(keyboard)
+
+
 async def reply_update(update: Update, text: str, keyboard: list):
     await update.message.reply_text(text=text,
                                     parse_mode=ParseMode.HTML,
-                                    reply_markup=InlineKeyboardMarkup(keyboard))
+                                    reply_markup=get_markup(keyboard))
 
 
-async def reply_query(query, text: str, keyboard: list):
+@metrics.timed("telegram_seconds", call="reply_query")
+async def reply_query(query, text: str, keyboard):
     await query.answer()
+    edited = EDIT_IN_PLACE and query.message.text is not None
+    if edited:
+        try:
+            await query.edit_message_text(text=text,
+                                          parse_mode=ParseMode.HTML,
+                                          reply_markup=get_markup(keyboard))
+            count_transition("edit", 2)
+            return
+        except BadRequest as e:
+            if "not modified" in str(e):
+                count_transition("edit", 2)
+                return
+
     await delete_query(query)
     await query.message.reply_text(text=text,
                                    parse_mode=ParseMode.HTML,
-                                   reply_markup=InlineKeyboardMarkup(keyboard))
+                                   reply_markup=get_markup(keyboard))
+    count_transition("resend", 4 if edited else 3)
 
 
-async def reply_alarm(context: ContextTypes.DEFAULT_TYPE, text: str, keyboard: list):
-    await context.bot.reply_text(text=text,
-                                 parse_mode=ParseMode.HTML,
-                                 reply_markup=InlineKeyboardMarkup(keyboard))
+async def reply_alarm(chat_id: int, text: str, keyboard: list):
+    await sender.queue.put(chat_id=chat_id,
+                           text=text,
+                           parse_mode=ParseMode.HTML,
+                           reply_markup=InlineKeyboardMarkup(keyboard))
 
 
-async def reply_photo(query, path: str, caption: str, keyboard: list):
+@metrics.timed("telegram_seconds", call="reply_photo")
+async def reply_photo(query, photo, caption: str, keyboard: list):
     await query.answer()
+    edited = EDIT_IN_PLACE and bool(query.message.photo)
+    if edited:
+        try:
+            message = await query.edit_message_media(InputMediaPhoto(media=photo,
+                                                                     caption=caption,
+                                                                     parse_mode=ParseMode.HTML),
+                                                     reply_markup=InlineKeyboardMarkup(keyboard))
+            count_transition("edit", 2)
+            return message
+        except BadRequest as e:
+            if "not modified" in str(e):
+                count_transition("edit", 2)
+                return query.message
+
     await delete_query(query)
-    await query.message.reply_photo(photo=open(path, "rb"),
-                                    caption=caption,
-                                    parse_mode=ParseMode.HTML,
-                                    reply_markup=InlineKeyboardMarkup(keyboard))
+    message = await query.message.reply_photo(photo=photo,
+                                              caption=caption,
+                                              parse_mode=ParseMode.HTML,
+                                              reply_markup=InlineKeyboardMarkup(keyboard))
+    count_transition("resend", 4 if edited else 3)
+    return message
+
+
+def count_transition(kind: str, calls: int):
+    transitions[kind] += 1
+    transitions[f"{kind}_calls"] += calls
+    logger.debug("%s transition took %d Bot API calls", kind, calls)
 
 
 async def delete_query(query):
@@ -60,38 +131,13 @@ async def delete_query(query):
         pass
 
 
-async def reply_select_cryptocurrency(query, data: list):
-    option = query.data.split('#')[0]
-    start, end = query.data.split('#')[-1].split("-")
-
-    keyboard = get_keyboard(data[int(start):int(end)], option)
-
-    if len(data) <= int(end) and not int(start):
-        keyboard.append([InlineKeyboardButton("🏠 Home", callback_data="home")])
-    elif len(data) <= int(end):
-        keyboard.append(
-            [InlineKeyboardButton("◀ Back", callback_data=f"{option}#{int(start) - 11}-{int(start)}"),
-             InlineKeyboardButton("🔍 Search", callback_data="search"),
-             InlineKeyboardButton("🏠 Home", callback_data="home")]
-        )
-    elif int(start) > 0:
-        keyboard.append(
-            [InlineKeyboardButton("◀ Back", callback_data=f"{option}#{int(start) - 11}-{int(start)}"),
-             InlineKeyboardButton("🔍 Search", callback_data="search"),
-             InlineKeyboardButton("🏠 Home", callback_data="home"),
-             InlineKeyboardButton("▶ Next", callback_data=f"{option}#{int(end)}-{int(end) + 11}")]
-        )
-    else:
-        keyboard.append(
-            [InlineKeyboardButton("🔍 Search", callback_data="search"),
-             InlineKeyboardButton("🏠 Home", callback_data="home"),
-             InlineKeyboardButton("▶ Next", callback_data=f"{option}#{int(end)}-{int(end) + 11}")])
-
+async def reply_select_cryptocurrency(query, keyboard):
     await reply_query(
         query=query, text="Select cryptocurrency 💬", keyboard=keyboard
     )
 
 
+@metrics.timed("handler_seconds", handler="start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await reply_update(update=update,
                        text="Welcome to <b>Cryptifica</b> 👋🏻\n<i>Your personal cryptocurrency checker bot</i> "
@@ -108,6 +154,11 @@ async def home(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    with metrics.timer("handler_seconds", handler=update.callback_query.data.split("#")[0].split("_")[0]):
+        await dispatch(update, context)
+
+
+async def dispatch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     context.user_data["command"] = query.data
     if query.data.split("#")[0] in ["price", "chart", "favorites-add"]:
@@ -138,20 +189,23 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await home(update, context)
     elif query.data == "search":
         await search_ask(update, context)
+    elif query.data.split("_")[0] == "search":
+        await search_select(update, context)
     elif query.data == "info":
         await info(update, context)
 
 
 async def select_cryptocurrency(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await reply_select_cryptocurrency(update.callback_query, [cryptocurrency['id'] for cryptocurrency in get_data()])
+    query = update.callback_query
+    await reply_select_cryptocurrency(query, keyboards.pages.get(await get_data(), *parse_page(query.data)))
 
 
 async def price(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
 
-    data = get_data(query.data.split("_")[-1])
-    name, symbol = data['name'], data['symbol']
-    price, percent = data['priceUsd'], '{0:.{1}f}'.format(float(data['changePercent24Hr']), 4)
+    data = await get_data(query.data.split("_")[-1])
+    name, symbol = data.name, data.symbol
+    price, percent = format_price(data.price), '{0:.{1}f}'.format(data.change, 4)
 
     keyboard = [[InlineKeyboardButton("◀ Back", callback_data="price#0-11"),
                  InlineKeyboardButton("🏠 Home", callback_data="home")]]
@@ -164,35 +218,43 @@ async def price(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
+    parts = query.data.split("_")
+    coin_id, range_name = parts[-1], parts[1] if len(parts) == 3 else DEFAULT_RANGE
 
-    create_images_folder()
-
-    data = get_data(query.data.split("_")[-1])
-    datas, prices = get_prices(query.data.split("_")[-1])
+    data = await get_data(coin_id)
 
-    chart = get_chart(datas, prices)
+    try:
+        chart = await charts.cache.get_chart(coin_id, range_name)
+    except asyncio.QueueFull:
+        await reply_query(query=query,
+                          text="Too many charts are being made right now, try again in a moment ⏳",
+                          keyboard=[[InlineKeyboardButton("◀ Back", callback_data="chart#0-11"),
+                                     InlineKeyboardButton("🏠 Home", callback_data="home")]])
+        return
 
-    name, symbol = data['name'], data['symbol']
+    name, symbol = data.name, data.symbol
 
     keyboard = [
+        [InlineKeyboardButton(f"· {option} ·" if option == range_name else option,
+                              callback_data=f"chart_{option}_{coin_id}") for option in RANGES],
         [InlineKeyboardButton("◀ Back", callback_data="chart#0-11"),
          InlineKeyboardButton("🏠 Home", callback_data="home")],
     ]
 
-    await reply_photo(query=query, path=f"images/{chart}.webp",
-                      caption=f"<b>{name} ({symbol})</b> {'📉' if prices[0] > prices[-1] else '📈'}",
-                      keyboard=keyboard)
-    delete_image(chart)
+    message = await reply_photo(query=query, photo=chart.photo,
+                                caption=f"<b>{name} ({symbol})</b> · {range_name} {'📉' if chart.falling else '📈'}",
+                                keyboard=keyboard)
+    if chart.file_id is None:
+        chart.uploaded(message.photo[-1].file_id)
 
 
-def create_images_folder():
-    if not os.path.exists("images"):
-        os.makedirs("images")
+async def prewarm_charts(context: ContextTypes.DEFAULT_TYPE):
+    if not charts.CHART_WARM_UP and renderer.pool is None: return
+    await charts.prewarm((await get_data()).ids)
 
 
-def delete_image(file_name: str):
-    if os.path.isfile(f"images/{file_name}.webp"):
-        os.remove(f"images/{file_name}.webp")
+async def warm_up_charts(context: ContextTypes.DEFAULT_TYPE):
+    await charts.warm_up()
 
 
 async def favorites(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -210,8 +272,8 @@ async def favorites(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def favorites_add(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
 
-    data = get_data(query.data.split("_")[-1])
-    favorites = Favorites.get(query.from_user.id).split(",")
+    data = await get_data(query.data.split("_")[-1])
+    favorites = await Favorites.get_async(query.from_user.id)
 
     keyboard = [
         [
@@ -220,42 +282,26 @@ async def favorites_add(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ]
     ]
 
-    await query.answer()
     if query.data.split("_")[-1] not in favorites:
-        Favorites.add(query.from_user.id, query.data.split("_")[-1])
-        await reply_query(query=query, text=f"<b>{data['name']}</b> added to favorites 🌟", keyboard=keyboard)
+        await Favorites.add_async(query.from_user.id, query.data.split("_")[-1])
+        await reply_query(query=query, text=f"<b>{data.name}</b> added to favorites 🌟", keyboard=keyboard)
     else:
-        await reply_query(query=query, text=f"<b>{data['name']}</b> already in favorites ⭐", keyboard=keyboard)
-
-
-def get_keyboard(cryptocurrencies, option):
-    keyboard = []
-    keyboard_layer = []
-
-    data = get_data()
-
-    for i in range(len(cryptocurrencies[:10])):
-        keyboard_layer.append(InlineKeyboardButton(get_cryptocurrency_data_by_id(data, cryptocurrencies[i])['symbol'],
-                                                   callback_data=f"{option}_{cryptocurrencies[i]}"))
-        if i == 4:
-            keyboard.append(keyboard_layer)
-            keyboard_layer = []
-    keyboard.append(keyboard_layer)
-
-    return keyboard
+        await reply_query(query=query, text=f"<b>{data.name}</b> already in favorites ⭐", keyboard=keyboard)
 
 
 async def select_favorites_remove(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await reply_select_cryptocurrency(query, Favorites.get(query.from_user.id).split(",")[:-1])
+    data = await get_data()
+    await reply_select_cryptocurrency(query, get_page(data, data.rank(await Favorites.get_async(query.from_user.id)),
+                                                      *parse_page(query.data)))
 
 
 async def favorites_remove(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
 
-    data = get_data(query.data.split("_")[-1])
+    data = await get_data(query.data.split("_")[-1])
 
-    Favorites.remove(query.from_user.id, query.data.split("_")[-1])
+    await Favorites.remove_async(query.from_user.id, query.data.split("_")[-1])
 
     keyboard = [
         [
@@ -264,7 +310,7 @@ async def favorites_remove(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ]
     ]
 
-    await reply_query(query=query, text=f"<b>{data['name']}</b> removed from favorites 🗑", keyboard=keyboard)
+    await reply_query(query=query, text=f"<b>{data.name}</b> removed from favorites 🗑", keyboard=keyboard)
 
 
 async def review(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -274,8 +320,8 @@ async def review(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("🏠 Home", callback_data="home")],
     ]
 
-    favorites = Favorites.get(query.from_user.id).split(",")[:-1]
-    review = get_favorite_review(get_data(),
+    favorites = await Favorites.get_async(query.from_user.id)
+    review = get_favorite_review(await get_data(),
                                  favorites) if favorites else ("You don't have any favorite cryptocurrencies yet. Add "
                                                                "to favorites to receive your personalized review 🧾")
 
@@ -285,26 +331,22 @@ async def review(update: Update, context: ContextTypes.DEFAULT_TYPE):
                       keyboard=keyboard)
 
 
-def get_favorite_review(data, favorites):
+def get_favorite_review(data, favorites, lines: dict = None):
+    lines = {} if lines is None else lines
     reviews = []
-    for favorite in favorites:
-        d = get_cryptocurrency_data_by_id(data, favorite)
-        reviews.append(
-            f" • {d['name']} ({d['symbol']}) — ${d['priceUsd']} ({'{0:.{1}f}'.format(float(d['changePercent24Hr']), 4)}%) "
-            f"{'📉' if d['changePercent24Hr'][0] == '-' else '📈'}")
+    for favorite in data.rank(favorites):
+        if favorite not in lines:
+            lines[favorite] = get_review_line(data.by_id(favorite))
+        if lines[favorite] is not None:
+            reviews.append(lines[favorite])
     return "\n".join(reviews)
 
 
-def get_cryptocurrency_data_by_id(data, cryptocurrency):
-    for d in data:
-        if d['id'] == cryptocurrency:
-            return d
-
-
-def get_cryptocurrency_data_by_symbol(data, symbol):
-    for d in data:
-        if d['symbol'] == symbol:
-            return d
+def get_review_line(d):
+    if d is None:
+        return None
+    return (f" • {d.name} ({d.symbol}) — ${format_price(d.price)} ({'{0:.{1}f}'.format(d.change, 4)}%) "
+            f"{'📉' if d.change < 0 else '📈'}")
 
 
 async def alarm(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -349,9 +391,7 @@ async def alarm_on(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def enable_alarm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    context.job_queue.run_daily(alarmed_review, time=datetime.time(hour=int(query.data.split('_')[-1])),
-                                days=(0, 1, 2, 3, 4, 5, 6), name=str(query.message.chat_id),
-                                chat_id=query.message.chat_id, data=str(query.from_user.id))
+    await Alarms.add(query.message.chat_id, query.from_user.id, int(query.data.split('_')[-1]))
 
 
 async def alarm_off(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -369,7 +409,7 @@ async def alarm_off(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def disable_alarm(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    context.job_queue.get_jobs_by_name(str(update.callback_query.message.chat_id))[0].schedule_removal()
+    await Alarms.remove(update.callback_query.message.chat_id)
 
 
 async def alarmed_review(context: ContextTypes.DEFAULT_TYPE):
@@ -377,15 +417,25 @@ async def alarmed_review(context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("🏠 Home", callback_data="home")],
     ]
 
-    favorites = Favorites.get(int(context.job.data)).split(",")[:-1]
-    review = get_favorite_review(get_data(),
-                                 favorites) if favorites else ("You don't have any favorite cryptocurrencies yet. Add "
-                                                               "to favorites to receive your personalized review 🧾")
+    if not await AlarmRuns.claim(datetime.datetime.now(datetime.timezone.utc).date(), context.job.data):
+        return
 
-    await reply_alarm(context=context,
-                      text=f"Daily Review 📝⏰\n<i>Prices of favorite cryptocurrencies at the current hour "
-                           f"💸</i>\n\n<i>{review}</i>",
-                      keyboard=keyboard)
+    subscribers = await Alarms.get(context.job.data)
+    if not subscribers:
+        return
+
+    data = await get_data()
+    favorites = await Favorites.get_many({user_id for _, user_id in subscribers})
+    lines = {}
+
+    for chat_id, user_id in subscribers:
+        review = get_favorite_review(data, favorites[user_id], lines) if favorites[user_id] else (
+            "You don't have any favorite cryptocurrencies yet. Add to favorites to receive your personalized review 🧾")
+
+        await reply_alarm(chat_id=chat_id,
+                          text=f"Daily Review 📝⏰\n<i>Prices of favorite cryptocurrencies at the current hour "
+                               f"💸</i>\n\n<i>{review}</i>",
+                          keyboard=keyboard)
 
 
 async def info(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -400,7 +450,7 @@ async def info(update: Update, context: ContextTypes.DEFAULT_TYPE):
                            f"personal cryptocurrency checker bot, made with ❤ on 🐍 by @m3r1v3 🤖💰</i>\n\n"
                            f"What can I do?\n\n"
                            f"<i> 💰 Show the current cryptocurrency prices\n"
-                           f" 📈 Show cryptocurrency price chart for the last 30 days\n"
+                           f" 📈 Show cryptocurrency price chart for the last day, week, month, year or all time\n"
                            f" 📝 Make review for your favorite cryptocurrencies\n ⭐ Save your cryptocurrencies to "
                            f"favorites\n"
                            f" 🔔 Make review for you in specified time\n"
@@ -415,46 +465,131 @@ async def search_ask(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
 
     await reply_query(query=update.callback_query,
-                      text="Send symbol of cryptocurrency (like $BTC or $ETH) to do someting with it 🔍",
+                      text="Send symbol or name of cryptocurrency (like $BTC or $ethereum) to do someting with it 🔍",
                       keyboard=keyboard)
 
 
+@metrics.timed("handler_seconds", handler="search-text")
 async def search(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.user_data.get("command", "") != "search": return
 
-    data = get_cryptocurrency_data_by_symbol(get_data(), update.message.text[1:])
-
-    if data is not None:
-        id, name, symbol = data['id'], data['name'], data['symbol']
-        keyboard = [
-            [InlineKeyboardButton("💰 Price", callback_data=f"price_{id}"),
-             InlineKeyboardButton("📈 Chart", callback_data=f"chart_{id}"),
-             InlineKeyboardButton("🌟 Add", callback_data=f"favorite-add_{id}") if id not in Favorites.get(
-                 update.message.from_user.id).split(",")
-             else InlineKeyboardButton("🗑 Remove", callback_data=f"favorites-remove_{id}")],
-            [InlineKeyboardButton("🏠 Home", callback_data="home")]
-        ]
+    data = await get_data()
+    results = [data.asset(i) for i in search_index.get_index(data).search(update.message.text, SEARCH_RESULTS)]
 
+    text = update.message.text[1:].strip().lower()
+    if results and text in (results[0].symbol.lower(), results[0].id.lower(), results[0].name.lower()):
+        await reply_update(
+            update=update,
+            text=f"Select <b>{results[0].name} ({results[0].symbol})</b> option 💬",
+            keyboard=get_search_keyboard(results[0], await Favorites.get_async(update.message.from_user.id)))
+    elif results:
+        keyboard = [[InlineKeyboardButton(f"{d.symbol} · {d.name}", callback_data=f"search_{d.id}")] for d in results]
+        keyboard.append([InlineKeyboardButton("🏠 Home", callback_data="home")])
         await reply_update(
             update=update,
-            text=f"Select <b>{name} ({symbol})</b> option 💬",
+            text=f"Results for <b>{html.escape(update.message.text[1:])}</b> 🔍\nSelect cryptocurrency 💬",
             keyboard=keyboard)
     else:
         keyboard = [[InlineKeyboardButton("🏠 Home", callback_data="home")]]
         await reply_update(
             update=update,
-            text=f"Sorry, I can't find <b>{update.message.text[1:]}</b> 🔍\nTry again",
+            text=f"Sorry, I can't find <b>{html.escape(update.message.text[1:])}</b> 🔍\nTry again",
             keyboard=keyboard,
         )
 
 
-if __name__ == "__main__":
-    create_db()
+async def search_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+
+    data = await get_data(query.data.split("_")[-1])
 
-    app = ApplicationBuilder().token(os.environ.get("BOT_TOKEN")).build()
+    await reply_query(query=query,
+                      text=f"Select <b>{data.name} ({data.symbol})</b> option 💬",
+                      keyboard=get_search_keyboard(data, await Favorites.get_async(query.from_user.id)))
+
+
+def get_search_keyboard(data, favorites):
+    return [
+        [InlineKeyboardButton("💰 Price", callback_data=f"price_{data.id}"),
+         InlineKeyboardButton("📈 Chart", callback_data=f"chart_{data.id}"),
+         InlineKeyboardButton("🌟 Add", callback_data=f"favorites-add_{data.id}") if data.id not in favorites
+         else InlineKeyboardButton("🗑 Remove", callback_data=f"favorites-remove_{data.id}")],
+        [InlineKeyboardButton("🏠 Home", callback_data="home")]
+    ]
+
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS: return
+
+    if context.args[:1] == ["profile"]:
+        action = context.args[1] if len(context.args) > 1 else ""
+        if action == "on":
+            metrics.profiler.start()
+            text = "Profiler is on ⏱"
+        elif action == "off":
+            metrics.profiler.stop()
+            text = "Profiler is off ⏱"
+        else:
+            text = metrics.profiler.top() or "No profiler samples yet ⏱"
+    else:
+        text = metrics.summary() or "No metrics yet 📊"
+
+    await update.message.reply_text(text=f"<pre>{html.escape(text[:STATS_LENGTH])}</pre>", parse_mode=ParseMode.HTML)
+
+
+async def write_metrics(context: ContextTypes.DEFAULT_TYPE):
+    await asyncio.to_thread(metrics.write, metrics.METRICS_FILE)
+
+
+async def startup(app):
+    await connect_async()
+    sender.queue.start(app.bot)
+    if metrics.METRICS_PORT:
+        app.bot_data["metrics_server"] = metrics.serve(metrics.METRICS_PORT)
+    if PRICE_STREAM:
+        stream.start()
+
+
+async def shutdown(app):
+    await stream.stop()
+    await sender.queue.stop()
+    metrics.profiler.stop()
+    if "metrics_server" in app.bot_data:
+        app.bot_data.pop("metrics_server").shutdown()
+    await close_client()
+    await async_engine.dispose()
+    renderer.shutdown()
+
+
+def build_app(builder: ApplicationBuilder = None, alarms: bool = True, prewarm: bool = True):
+    builder = builder or ApplicationBuilder().token(os.environ.get("BOT_TOKEN")).base_url(BOT_API_URL)
+    app = (builder.application_class(ConcurrentApplication).concurrent_updates(UNBOUNDED)
+           .persistence(DatabasePersistence()).post_init(startup).post_shutdown(shutdown).build())
 
     app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("stats", stats))
     app.add_handler(CallbackQueryHandler(button))
-    app.add_handler(MessageHandler(filters.Regex('[$][A-Z]{1,}'), search))
+    app.add_handler(MessageHandler(filters.Regex(r'^\$\S'), search))
+
+    if alarms:
+        for hour in ALARM_HOURS:
+            app.job_queue.run_daily(alarmed_review, time=datetime.time(hour=hour),
+                                    days=(0, 1, 2, 3, 4, 5, 6), name=f"alarm-{hour}", data=hour)
+
+    if charts.CHART_WARM_UP:
+        app.job_queue.run_once(warm_up_charts, when=0)
+    if prewarm:
+        if charts.CHART_WARM_UP:
+            app.job_queue.run_once(prewarm_charts, when=10)
+        app.job_queue.run_repeating(prewarm_charts, interval=charts.CHART_BUCKET,
+                                    first=charts.cache.seconds_to_next_bucket() + 60)
+    if metrics.METRICS_FILE:
+        app.job_queue.run_repeating(write_metrics, interval=METRICS_INTERVAL, first=METRICS_INTERVAL)
+
+    return app
+
+
+if __name__ == "__main__":
+    create_db()
 
-    app.run_polling()
+    build_app().run_polling()
@@ -0,0 +1,70 @@
+import time
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, size: int):
+        self.size = size
+        self.items = OrderedDict()
+        self.hits, self.misses = 0, 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default=None):
+        if key in self.items:
+            self.hits += 1
+            self.items.move_to_end(key)
+            return self.items[key]
+        self.misses += 1
+        return default
+
+    def peek(self, key, default=None):
+        return self.items.get(key, default)
+
+    def set(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.size:
+            self.evict(*self.items.popitem(last=False))
+
+    def pop(self, key, default=None):
+        if key in self.items:
+            value = self.items.pop(key)
+            self.evict(key, value)
+            return value
+        return default
+
+    def clear(self):
+        while self.items:
+            self.evict(*self.items.popitem(last=False))
+
+    def stats(self) -> dict:
+        return {'size': len(self.items), 'hits': self.hits, 'misses': self.misses}
+
+    def evict(self, key, value):
+        pass
+
+
+class TTLCache(LRUCache):
+    def __init__(self, size: int, ttl: float):
+        super().__init__(size)
+        self.ttl = ttl
+        self.expires = {}
+
+    def get(self, key, default=None):
+        if self.ttl and key in self.items and self.expires[key] < time.monotonic():
+            self.pop(key)
+        return super().get(key, default)
+
+    def set(self, key, value):
+        if key not in self.items:
+            self.expires[key] = time.monotonic() + self.ttl
+        super().set(key, value)
+
+    def evict(self, key, value):
+        self.expires.pop(key, None)
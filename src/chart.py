@@ -1,23 +1,31 @@
 import uuid
 
+import numpy as np
 import plotly.express as px
-import pandas as pd
 
 
-def get_chart(data, price) -> str:
-    file_name = str(uuid.uuid4())
+def get_chart(dates: np.ndarray, prices: np.ndarray, in_memory: bool = False):
+    fig = make_chart(dates, prices)
+
+    if in_memory:
+        return fig.to_image(format='webp', width=1280, height=720)
 
-    fig = make_chart(pd.DataFrame({'date': data, 'price': price}))
+    file_name = str(uuid.uuid4())
     fig.write_image(f'images/{file_name}.webp', width=1280, height=720)
 
     return file_name
 
 
-def make_chart(df: pd.DataFrame):
-    first, last = df['price'][0], df['price'][df['price'].count()-1]
-    min, max = df['price'].min(), df['price'].max()
+def warm_up():
+    fig = make_chart(np.array(['2023-01-01', '2023-01-02'], dtype='datetime64[ms]'), np.array([1.0, 2.0]))
+    fig.to_image(format='webp', width=64, height=36)
+
+
+def make_chart(dates: np.ndarray, prices: np.ndarray):
+    first, last = prices[0], prices[-1]
+    min, max = prices.min(), prices.max()
 
-    fig = px.area(df, x='date', y='price',
+    fig = px.area(x=dates, y=prices,
                   color_discrete_sequence=[f"{'#a67b77' if first > last else '#87a677'}"],
                   range_y=[min, max])
     fig.add_hline(y=last,
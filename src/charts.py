@@ -0,0 +1,117 @@
+import os
+import time
+import asyncio
+import logging
+import importlib
+
+import metrics
+import renderer
+
+from cache import LRUCache
+from crypto import DEFAULT_RANGE, RANGES, TIERS, get_prices
+
+CHART_BUCKET = int(os.environ.get("CHART_BUCKET", 7200))
+CHART_CACHE_SIZE = int(os.environ.get("CHART_CACHE_SIZE", 256))
+CHART_PREWARM = int(os.environ.get("CHART_PREWARM", 10))
+CHART_WARM_UP = os.environ.get("CHART_WARM_UP", "0") == "1"
+
+logger = logging.getLogger(__name__)
+
+
+class Chart:
+    __slots__ = ("image", "file", "file_id", "falling")
+
+    def __init__(self, image, falling: bool):
+        self.image, self.file = (image, None) if isinstance(image, bytes) else (None, image)
+        self.file_id, self.falling = None, falling
+
+    @property
+    def photo(self):
+        if self.file_id is not None:
+            return self.file_id
+        if self.image is not None:
+            return self.image
+        with open(f"images/{self.file}.webp", "rb") as file:
+            return file.read()
+
+    def uploaded(self, file_id: str):
+        self.file_id, self.image = file_id, None
+
+
+class ChartCache(LRUCache):
+    def __init__(self, size: int, bucket_size: int):
+        super().__init__(size)
+        self.bucket_size, self.bucket = bucket_size, None
+        self.pending = {}
+
+    def get_bucket_size(self, range_name: str = DEFAULT_RANGE) -> int:
+        return min(self.bucket_size, TIERS[RANGES[range_name][0]] // 1000)
+
+    def current_bucket(self, range_name: str = DEFAULT_RANGE) -> int:
+        return int(time.time() // self.get_bucket_size(range_name))
+
+    def seconds_to_next_bucket(self, range_name: str = DEFAULT_RANGE) -> float:
+        return self.get_bucket_size(range_name) - time.time() % self.get_bucket_size(range_name)
+
+    def invalidate(self):
+        bucket = int(time.time() // min(map(self.get_bucket_size, RANGES)))
+        if bucket != self.bucket:
+            for key in [key for key in self.items if key[2] != self.current_bucket(key[1])]:
+                self.pop(key)
+            self.bucket = bucket
+
+    def evict(self, key, chart: Chart):
+        if chart.file is not None:
+            delete_image(chart.file)
+
+    async def get_chart(self, coin_id: str, range_name: str = DEFAULT_RANGE) -> Chart:
+        self.invalidate()
+
+        key = (coin_id, range_name, self.current_bucket(range_name))
+        chart = self.get(key)
+        if chart is not None:
+            return chart
+
+        if key not in self.pending:
+            self.pending[key] = asyncio.ensure_future(self.render(key))
+        return await asyncio.shield(self.pending[key])
+
+    async def render(self, key) -> Chart:
+        try:
+            dates, prices = await get_prices(key[0], key[1])
+            if not renderer.CHART_IN_MEMORY:
+                create_images_folder()
+            chart = Chart(await renderer.get_chart(dates, prices), prices[0] > prices[-1])
+            self.set(key, chart)
+            return chart
+        finally:
+            self.pending.pop(key, None)
+
+
+cache = ChartCache(CHART_CACHE_SIZE, CHART_BUCKET)
+metrics.gauge("cache_hits_total", lambda: cache.hits, cache="charts")
+metrics.gauge("cache_misses_total", lambda: cache.misses, cache="charts")
+metrics.gauge("cache_size", lambda: len(cache), cache="charts")
+
+
+async def prewarm(coin_ids: list):
+    for coin_id in coin_ids[:CHART_PREWARM]:
+        try:
+            await cache.get_chart(coin_id)
+        except Exception as e:
+            logger.warning("Prewarming the %s chart failed: %r", coin_id, e)
+
+
+async def warm_up():
+    await asyncio.to_thread(importlib.import_module, "history")
+    renderer.start()
+
+
+def create_images_folder():
+    if not os.path.exists("images"):
+        os.makedirs("images")
+
+
+def delete_image(file_name: str):
+    if os.path.isfile(f"images/{file_name}.webp"):
+        os.remove(f"images/{file_name}.webp")
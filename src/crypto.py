@@ -1,17 +1,293 @@
-import requests
-import datetime
+import os
+import sys
+import time
+import asyncio
+import logging
 
+import httpx
+import metrics
 
-def get_data(coin_id: str = ""):
-    return requests.get(f"https://api.coincap.io/v2/assets/{coin_id}?limit=1024").json()["data"]
+from array import array
+from typing import NamedTuple
 
+from database import Rollups
 
-def get_prices(coin_id: str):
-    data = requests.get(f"https://api.coincap.io/v2/assets/{coin_id}/history?interval=h2").json()["data"][-360:]
+API_URL = os.environ.get("COINCAP_URL", "https://api.coincap.io/v2")
 
-    time, price = [], []
+SNAPSHOT_TTL = float(os.environ.get("SNAPSHOT_TTL", 60))
+SNAPSHOT_REFRESH = float(os.environ.get("SNAPSHOT_REFRESH", SNAPSHOT_TTL * 0.75))
+STREAM_SNAPSHOT_TTL = float(os.environ.get("STREAM_SNAPSHOT_TTL", 900))
+SNAPSHOT_MAX_STALE = float(os.environ.get("SNAPSHOT_MAX_STALE", 900))
 
-    for i in data:
-        time.append(str(datetime.datetime.fromtimestamp(i['time'] // 1000)))
-        price.append(float(i['priceUsd']))
-    return time, price
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 10))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", 3))
+HTTP_BACKOFF = float(os.environ.get("HTTP_BACKOFF", 0.5))
+
+MINUTE, HOUR, DAY = 60 * 1000, 60 * 60 * 1000, 24 * 60 * 60 * 1000
+
+TIERS = {"m5": 5 * MINUTE, "h1": HOUR, "d1": DAY}
+RETENTION = {"m5": 2 * DAY, "h1": 32 * DAY, "d1": 0}
+RANGES = {"24h": ("m5", DAY), "7d": ("h1", 7 * DAY), "30d": ("h1", 30 * DAY), "1y": ("d1", 365 * DAY),
+          "all": ("d1", 0)}
+DEFAULT_RANGE = "30d"
+
+CHART_POINTS = int(os.environ.get("CHART_POINTS", 0))
+
+logger = logging.getLogger(__name__)
+
+client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global client
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(base_url=API_URL,
+                                   timeout=HTTP_TIMEOUT,
+                                   limits=httpx.Limits(max_connections=HTTP_POOL_SIZE,
+                                                       max_keepalive_connections=HTTP_POOL_SIZE))
+    return client
+
+
+async def close_client():
+    if client is not None:
+        await client.aclose()
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+async def fetch(path: str, **params):
+    endpoint = "history" if path.endswith("/history") else "assets" if path == "/assets" else "asset"
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            with metrics.timer("coincap_seconds", endpoint=endpoint):
+                response = await get_client().get(path, params=params)
+                response.raise_for_status()
+            return response.json()["data"]
+        except httpx.HTTPError as e:
+            if attempt == HTTP_RETRIES or not is_retryable(e):
+                raise
+            metrics.count("coincap_retries_total", endpoint=endpoint)
+            await asyncio.sleep(HTTP_BACKOFF * 2 ** attempt)
+
+
+class Asset(NamedTuple):
+    id: str
+    symbol: str
+    name: str
+    price: float
+    change: float
+
+    @staticmethod
+    def from_json(data: dict):
+        return Asset(data['id'], data['symbol'], data['name'],
+                     to_float(data['priceUsd']), to_float(data['changePercent24Hr']))
+
+
+class Market:
+    __slots__ = ("ids", "symbols", "names", "prices", "changes", "id_index", "symbol_index")
+
+    def __init__(self, assets: list):
+        self.ids = [sys.intern(a['id']) for a in assets]
+        self.symbols = [sys.intern(a['symbol']) for a in assets]
+        self.names = [a['name'] for a in assets]
+        self.prices = array('d', (to_float(a['priceUsd']) for a in assets))
+        self.changes = array('d', (to_float(a['changePercent24Hr']) for a in assets))
+
+        self.id_index = {coin_id: i for i, coin_id in enumerate(self.ids)}
+        self.symbol_index = {}
+        for i, symbol in enumerate(self.symbols):
+            self.symbol_index.setdefault(symbol.upper(), i)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return (self.asset(i) for i in range(len(self.ids)))
+
+    def asset(self, i: int) -> Asset:
+        return Asset(self.ids[i], self.symbols[i], self.names[i], self.prices[i], self.changes[i])
+
+    def by_id(self, coin_id: str):
+        i = self.id_index.get(coin_id)
+        return None if i is None else self.asset(i)
+
+    def by_symbol(self, symbol: str):
+        i = self.symbol_index.get(symbol.upper())
+        return None if i is None else self.asset(i)
+
+    def set_price(self, coin_id: str, price: float) -> bool:
+        i = self.id_index.get(coin_id)
+        if i is None:
+            return False
+        self.prices[i] = price
+        return True
+
+    def rank(self, coin_ids) -> list:
+        return sorted(coin_ids, key=lambda coin_id: self.id_index.get(coin_id, len(self.ids)))
+
+
+def to_float(value) -> float:
+    return float("nan") if value is None else float(value)
+
+
+def format_price(price: float) -> str:
+    return '{0:.12f}'.format(price).rstrip('0').rstrip('.')
+
+
+class Snapshot:
+    def __init__(self, ttl: float, refresh: float, max_stale: float = SNAPSHOT_MAX_STALE):
+        self.ttl, self.refresh_after, self.max_stale = ttl, min(refresh, ttl), max_stale
+        self.data, self.updated = None, 0.0
+        self.task, self.failed = None, False
+        self.streaming, self.live = False, {}
+
+    def age(self) -> float:
+        return time.monotonic() - self.updated
+
+    def limits(self) -> tuple:
+        if self.streaming:
+            return STREAM_SNAPSHOT_TTL, STREAM_SNAPSHOT_TTL * self.refresh_after / self.ttl
+        return self.ttl, self.refresh_after
+
+    def fresh(self) -> bool:
+        return self.data is not None and self.age() < self.limits()[0]
+
+    def usable(self) -> bool:
+        return self.data is not None and self.age() < max(self.max_stale, self.limits()[0])
+
+    def set_streaming(self, streaming: bool):
+        self.streaming = streaming
+        if not streaming:
+            self.live.clear()
+
+    def set_prices(self, prices: dict) -> int:
+        self.live.update(prices)
+        if self.data is None:
+            return 0
+        return sum(self.data.set_price(coin_id, price) for coin_id, price in prices.items())
+
+    async def get(self):
+        if self.fresh():
+            metrics.count("snapshot_requests_total", result="hit")
+            if self.age() >= self.limits()[1]:
+                self.refresh_in_background()
+            return self.data
+        if self.failed and self.usable():
+            metrics.count("snapshot_requests_total", result="stale")
+            self.refresh_in_background()
+            return self.data
+        metrics.count("snapshot_requests_total", result="miss")
+        try:
+            return await self.refresh()
+        except httpx.HTTPError:
+            if not self.usable():
+                raise
+            metrics.count("snapshot_requests_total", result="stale")
+            return self.data
+
+    async def refresh(self):
+        if self.task is None:
+            self.start()
+        return await asyncio.shield(self.task)
+
+    def refresh_in_background(self):
+        if self.task is None:
+            self.start()
+
+    def start(self):
+        self.task = asyncio.create_task(self.load())
+        self.task.add_done_callback(self.loaded)
+
+    def loaded(self, task: asyncio.Task):
+        self.failed = not task.cancelled() and task.exception() is not None
+        if self.failed:
+            metrics.count("snapshot_refresh_errors_total")
+            logger.warning("Snapshot refresh failed: %r", task.exception())
+
+    async def load(self):
+        try:
+            market = await fetch_assets()
+            for coin_id, price in self.live.items():
+                market.set_price(coin_id, price)
+            self.data, self.updated = market, time.monotonic()
+            return self.data
+        finally:
+            self.task = None
+
+
+snapshot = Snapshot(SNAPSHOT_TTL, SNAPSHOT_REFRESH)
+
+
+async def fetch_assets():
+    return Market(await fetch("/assets", limit=1024))
+
+
+@metrics.timed("crypto_seconds", call="get_data")
+async def get_data(coin_id: str = ""):
+    if not coin_id:
+        return await snapshot.get()
+
+    if snapshot.fresh() and coin_id in snapshot.data.id_index:
+        return snapshot.data.by_id(coin_id)
+    try:
+        return Asset.from_json(await fetch(f"/assets/{coin_id}"))
+    except httpx.HTTPError:
+        if not snapshot.usable() or coin_id not in snapshot.data.id_index:
+            raise
+        metrics.count("snapshot_requests_total", result="stale")
+        return snapshot.data.by_id(coin_id)
+
+
+history_locks, history_checked = {}, {}
+
+
+async def update_history(coin_id: str, tier: str):
+    import history
+    async with history_locks.setdefault(coin_id, asyncio.Lock()):
+        now, changed, finer, needed = int(time.time() * 1000), None, None, True
+        for name, step in TIERS.items():
+            last = await Rollups.last(coin_id, name)
+            before = now - RETENTION[name] if RETENTION[name] else 0
+            covered = now - RETENTION[finer] if finer and RETENTION[finer] else 0
+            if last is None and not needed:
+                break
+            needed = needed and name != tier
+
+            if last is None:
+                points = await fetch(f"/assets/{coin_id}/history", interval=name,
+                                     **({"start": before, "end": now} if before else {}))
+            elif (finer is None or last < covered) and now - last > step \
+                    and now - history_checked.get((coin_id, name), 0) > step:
+                points = await fetch(f"/assets/{coin_id}/history", interval=name, start=last + 1, end=now)
+                history_checked[coin_id, name] = now
+            else:
+                points = []
+
+            if points:
+                times, prices = history.parse(points)
+                await Rollups.add(coin_id, name, history.rows(times, prices, prices, prices, prices), before)
+                if finer is None or last is not None:
+                    changed = int(times[0])
+            elif finer is not None and changed is not None and (last is None or last >= covered):
+                changed = max(changed // step * step, -(-covered // step) * step)
+                columns = history.rollup(*history.ohlc(await Rollups.get(coin_id, finer, changed)), step)
+                await Rollups.add(coin_id, name, history.rows(*columns), before)
+            finer = name
+
+
+@metrics.timed("crypto_seconds", call="get_prices")
+async def get_prices(coin_id: str, range_name: str = DEFAULT_RANGE, points: int = CHART_POINTS):
+    import history
+    tier, span = RANGES[range_name]
+    await update_history(coin_id, tier)
+    times, _, _, _, prices = history.ohlc(await Rollups.get(coin_id, tier, int(time.time() * 1000) - span
+                                                            if span else 0))
+
+    if points:
+        times, prices = history.lttb(times, prices, points)
+    return history.to_datetime(times), prices
@@ -1,15 +1,96 @@
 import os
+import asyncio
+import logging
+import datetime
 
-from sqlalchemy import create_engine
+from sqlalchemy import JSON, BigInteger, MetaData, Table, create_engine, delete, func, insert, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
 
-from sqlalchemy.orm import DeclarativeBase, Mapped, Session
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import DeclarativeBase, Mapped
 from sqlalchemy.orm import mapped_column
 
-engine = create_engine(os.environ.get('DATABASE_URL'))
+import metrics
+
+from cache import TTLCache
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 5))
+DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW', 10))
+DATABASE_POOL_RECYCLE = int(os.environ.get('DATABASE_POOL_RECYCLE', 1800))
+DATABASE_RETRIES = int(os.environ.get('DATABASE_RETRIES', 3))
+DATABASE_BACKOFF = float(os.environ.get('DATABASE_BACKOFF', 0.5))
+
+logger = logging.getLogger(__name__)
+
+
+def get_async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    if scheme in ("postgres", "postgresql", "postgresql+psycopg2"):
+        return f"postgresql+asyncpg://{rest}"
+    if scheme == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    return url
+
+
+def get_pool_options(url: str) -> dict:
+    options = {'pool_pre_ping': True, 'pool_recycle': DATABASE_POOL_RECYCLE}
+    if not url.startswith("sqlite"):
+        options.update(pool_size=DATABASE_POOL_SIZE, max_overflow=DATABASE_MAX_OVERFLOW)
+    return options
+
+
+engine = create_engine(DATABASE_URL, **get_pool_options(DATABASE_URL))
+async_engine = create_async_engine(get_async_url(DATABASE_URL), **get_pool_options(DATABASE_URL))
+
+FAVORITES_CACHE_SIZE = int(os.environ.get('FAVORITES_CACHE_SIZE', 10000))
+FAVORITES_CACHE_TTL = float(os.environ.get('FAVORITES_CACHE_TTL', 60))
+favorites_cache = TTLCache(FAVORITES_CACHE_SIZE, FAVORITES_CACHE_TTL)
+metrics.gauge("cache_hits_total", lambda: favorites_cache.hits, cache="favorites")
+metrics.gauge("cache_misses_total", lambda: favorites_cache.misses, cache="favorites")
+metrics.gauge("cache_size", lambda: len(favorites_cache), cache="favorites")
 
 
 def create_db():
-    Base.metadata.create_engine(engine)
+    Base.metadata.create_all(engine)
+    migrate_favorites()
+    drop_history()
+
+
+async def connect_async():
+    async with async_engine.connect():
+        pass
+
+
+def migrate_favorites():
+    if not inspect(engine).has_table("favorites"):
+        return
+
+    legacy = Table("favorites", MetaData(), autoload_with=engine)
+    with engine.begin() as connection:
+        rows = connection.execute(select(legacy.c.user_id, legacy.c.favorites)).all()
+        values = [{'user_id': user_id, 'coin_id': coin_id}
+                  for user_id, favorites in rows for coin_id in set((favorites or "").split(",")) if coin_id]
+        if values:
+            connection.execute(upsert(Favorites), values)
+        legacy.drop(connection)
+    favorites_cache.clear()
+
+
+def drop_history():
+    if inspect(engine).has_table("history"):
+        Table("history", MetaData(), autoload_with=engine).drop(engine)
+
+
+def upsert(model, update: tuple = ()):
+    if engine.dialect.name in ("postgresql", "sqlite"):
+        statement = (postgresql if engine.dialect.name == "postgresql" else sqlite).insert(model)
+        if update:
+            return statement.on_conflict_do_update(index_elements=model.__table__.primary_key.columns,
+                                                   set_={column: statement.excluded[column] for column in update})
+        return statement.on_conflict_do_nothing()
+    return insert(model).prefix_with("IGNORE")
 
 
 class Base(DeclarativeBase):
@@ -17,51 +98,211 @@ class Base(DeclarativeBase):
 
 
 class Favorites(Base):
-    __tablename__ = "favorites"
+    __tablename__ = "user_favorites"
 
-    id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(unique=True, nullable=False)
-    favorites: Mapped[str]
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    coin_id: Mapped[str] = mapped_column(primary_key=True)
 
     @staticmethod
-    def get(user_id: int):
-        with Session(engine) as session:
-            session.begin()
+    @metrics.timed("database_seconds", call="favorites_get_many")
+    async def get_many(user_ids) -> dict:
+        favorites = {user_id: favorites_cache.get(user_id) for user_id in user_ids}
+        missing = [user_id for user_id, coin_ids in favorites.items() if coin_ids is None]
+        if missing:
+            loaded = {user_id: set() for user_id in missing}
+            async with AsyncSession(async_engine) as session:
+                for user_id, coin_id in await session.execute(select(Favorites.user_id, Favorites.coin_id)
+                                                              .filter(Favorites.user_id.in_(missing))):
+                    loaded[user_id].add(coin_id)
+            favorites.update((user_id, frozenset(coin_ids)) for user_id, coin_ids in loaded.items())
+        return favorites
+
+    @staticmethod
+    @metrics.timed("database_seconds", call="favorites_get_async")
+    async def get_async(user_id: int) -> frozenset:
+        favorites = favorites_cache.get(user_id)
+        if favorites is None:
+            async with AsyncSession(async_engine) as session:
+                favorites = frozenset(await session.scalars(select(Favorites.coin_id)
+                                                            .filter(Favorites.user_id == user_id)))
+            favorites_cache.set(user_id, favorites)
+        return favorites
+
+    @staticmethod
+    @metrics.timed("database_seconds", call="favorites_add_async")
+    async def add_async(user_id: int, favorite: str):
+        async with AsyncSession(async_engine) as session:
+            try:
+                await session.execute(upsert(Favorites), {'user_id': user_id, 'coin_id': favorite})
+            except Exception:
+                await session.rollback()
+                favorites_cache.pop(user_id)
+            else:
+                await session.commit()
+                if user_id in favorites_cache:
+                    favorites_cache.set(user_id, favorites_cache.peek(user_id) | {favorite})
+
+    @staticmethod
+    @metrics.timed("database_seconds", call="favorites_remove_async")
+    async def remove_async(user_id: int, favorite: str):
+        async with AsyncSession(async_engine) as session:
             try:
-                if not session.query(Favorites.id).filter(Favorites.user_id == user_id).count():
-                    session.add(Favorites(user_id=user_id, favorites=""))
-                    session.commit()
-                return session.query(Favorites).filter(Favorites.user_id == user_id).first().favorites
+                await session.execute(delete(Favorites).filter(Favorites.user_id == user_id,
+                                                               Favorites.coin_id == favorite))
             except Exception:
-                session.rollback()
+                await session.rollback()
+                favorites_cache.pop(user_id)
+            else:
+                await session.commit()
+                if user_id in favorites_cache:
+                    favorites_cache.set(user_id, favorites_cache.peek(user_id) - {favorite})
+
+    def __repr__(self):
+        return f"Favorites(user_id={self.user_id!r}, coin_id={self.coin_id!r})"
+
+
+class Rollups(Base):
+    __tablename__ = "rollups"
+
+    coin_id: Mapped[str] = mapped_column(primary_key=True)
+    tier: Mapped[str] = mapped_column(primary_key=True)
+    time: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    open: Mapped[float]
+    high: Mapped[float]
+    low: Mapped[float]
+    close: Mapped[float]
+
+    @staticmethod
+    @metrics.timed("database_seconds", call="rollups_get")
+    async def get(coin_id: str, tier: str, start: int = 0):
+        async with AsyncSession(async_engine) as session:
+            return (await session.execute(select(Rollups.time, Rollups.open, Rollups.high, Rollups.low, Rollups.close)
+                                          .filter(Rollups.coin_id == coin_id, Rollups.tier == tier,
+                                                  Rollups.time >= start)
+                                          .order_by(Rollups.time))).all()
+
+    @staticmethod
+    @metrics.timed("database_seconds", call="rollups_last")
+    async def last(coin_id: str, tier: str):
+        async with AsyncSession(async_engine) as session:
+            return await session.scalar(select(func.max(Rollups.time))
+                                        .filter(Rollups.coin_id == coin_id, Rollups.tier == tier))
+
+    @staticmethod
+    @metrics.timed("database_seconds", call="rollups_add")
+    async def add(coin_id: str, tier: str, rows: list, before: int = 0):
+        async with AsyncSession(async_engine) as session:
+            try:
+                await session.execute(upsert(Rollups, update=("open", "high", "low", "close")),
+                                      [{'coin_id': coin_id, 'tier': tier, 'time': time,
+                                        'open': open, 'high': high, 'low': low, 'close': close}
+                                       for time, open, high, low, close in rows])
+                if before:
+                    await session.execute(delete(Rollups).filter(Rollups.coin_id == coin_id, Rollups.tier == tier,
+                                                                 Rollups.time < before))
+            except Exception:
+                await session.rollback()
+            else:
+                await session.commit()
+
+    def __repr__(self):
+        return f"Rollups(coin_id={self.coin_id!r}, tier={self.tier!r}, time={self.time!r}, close={self.close!r})"
+
+
+class Alarms(Base):
+    __tablename__ = "alarms"
+
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    hour: Mapped[int] = mapped_column(index=True)
+
+    @staticmethod
+    async def get(hour: int) -> list:
+        async with AsyncSession(async_engine) as session:
+            return (await session.execute(select(Alarms.chat_id, Alarms.user_id).filter(Alarms.hour == hour))).all()
+
+    @staticmethod
+    async def add(chat_id: int, user_id: int, hour: int):
+        async with AsyncSession(async_engine) as session:
+            try:
+                await session.execute(upsert(Alarms, update=("user_id", "hour")),
+                                      {'chat_id': chat_id, 'user_id': user_id, 'hour': hour})
+            except Exception:
+                await session.rollback()
+            else:
+                await session.commit()
+
+    @staticmethod
+    async def remove(chat_id: int):
+        async with AsyncSession(async_engine) as session:
+            try:
+                await session.execute(delete(Alarms).filter(Alarms.chat_id == chat_id))
+            except Exception:
+                await session.rollback()
+            else:
+                await session.commit()
+
+    def __repr__(self):
+        return f"Alarms(chat_id={self.chat_id!r}, user_id={self.user_id!r}, hour={self.hour!r})"
+
+
+class AlarmRuns(Base):
+    __tablename__ = "alarm_runs"
+
+    day: Mapped[datetime.date] = mapped_column(primary_key=True)
+    hour: Mapped[int] = mapped_column(primary_key=True)
+
+    @staticmethod
+    async def claim(day: datetime.date, hour: int) -> bool:
+        for attempt in range(DATABASE_RETRIES + 1):
+            try:
+                async with async_engine.begin() as connection:
+                    result = await connection.execute(upsert(AlarmRuns).values(day=day, hour=hour))
+                    await connection.execute(delete(AlarmRuns)
+                                             .filter(AlarmRuns.day < day - datetime.timedelta(days=7)))
+                    return result.rowcount > 0
+            except OperationalError as e:
+                if attempt == DATABASE_RETRIES:
+                    raise
+                logger.warning("Claiming the %s %d:00 review failed, retrying: %r", day, hour, e)
+                await asyncio.sleep(DATABASE_BACKOFF * 2 ** attempt)
+
+    def __repr__(self):
+        return f"AlarmRuns(day={self.day!r}, hour={self.hour!r})"
+
+
+class UserData(Base):
+    __tablename__ = "user_data"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    data: Mapped[dict] = mapped_column(JSON)
+
+    @staticmethod
+    @metrics.timed("database_seconds", call="user_data_get")
+    async def get(user_id: int) -> dict:
+        async with AsyncSession(async_engine) as session:
+            return await session.scalar(select(UserData.data).filter(UserData.user_id == user_id)) or {}
 
     @staticmethod
-    def add(user_id: int, favorite: str):
-        with Session(engine) as session:
-            session.begin()
+    @metrics.timed("database_seconds", call="user_data_set")
+    async def set(user_id: int, data: dict):
+        async with AsyncSession(async_engine) as session:
             try:
-                if session.query(Favorites.id).filter(Favorites.user_id == user_id).count():
-                    session.query(Favorites).filter(Favorites.user_id == user_id).update({
-                        'favorites': f'{session.query(Favorites).filter(Favorites.user_id == user_id).first().favorites}{favorite},'})
-                else:
-                    session.add(Favorites(user_id=user_id, favorites=f"{favorite},"))
+                await session.execute(upsert(UserData, update=("data",)), {'user_id': user_id, 'data': data})
             except Exception:
-                session.rollback()
+                await session.rollback()
             else:
-                session.commit()
+                await session.commit()
 
     @staticmethod
-    def remove(user_id: int, favorite: str):
-        with Session(engine) as session:
-            session.begin()
+    async def remove(user_id: int):
+        async with AsyncSession(async_engine) as session:
             try:
-                if session.query(Favorites.id).filter(Favorites.user_id == user_id).count():
-                    session.query(Favorites).filter(Favorites.user_id == user_id).update({
-                        'favorites': f'{session.query(Favorites).filter(Favorites.user_id == user_id).first().favorites.replace(f"{favorite},", "")}'})
+                await session.execute(delete(UserData).filter(UserData.user_id == user_id))
             except Exception:
-                session.rollback()
+                await session.rollback()
             else:
-                session.commit()
+                await session.commit()
 
     def __repr__(self):
-        return f"Favorites(id={self.id!r}, user_id={self.user_id!r}, favorites={self.favorites!r})"
+        return f"UserData(user_id={self.user_id!r}, data={self.data!r})"
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def parse(points: list):
+    times = np.fromiter((point['time'] for point in points), dtype=np.int64, count=len(points))
+    prices = np.array([point['priceUsd'] for point in points], dtype=np.str_).astype(np.float64)
+    return times, prices
+
+
+def ohlc(rows: list):
+    times = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    return (times,) + tuple(np.fromiter((row[i] for row in rows), dtype=np.float64, count=len(rows))
+                            for i in range(1, 5))
+
+
+def rows(*columns) -> list:
+    return list(zip(*(column.tolist() for column in columns)))
+
+
+def rollup(times: np.ndarray, opens: np.ndarray, highs: np.ndarray, lows: np.ndarray, closes: np.ndarray,
+           step: int):
+    if not len(times):
+        return times, opens, highs, lows, closes
+    buckets = times // step * step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(times)] - 1
+    return (buckets[starts], opens[starts], np.maximum.reduceat(highs, starts), np.minimum.reduceat(lows, starts),
+            closes[ends])
+
+
+def to_datetime(times: np.ndarray) -> np.ndarray:
+    return times.astype('datetime64[ms]')
+
+
+def lttb(times: np.ndarray, prices: np.ndarray, threshold: int):
+    size = len(times)
+    if threshold < 3 or threshold >= size:
+        return times, prices
+
+    x = times.astype(np.float64)
+    edges = np.linspace(1, size - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else size
+        average_x, average_y = x[end:next_end].mean(), prices[end:next_end].mean()
+
+        area = np.abs((x[a] - average_x) * (prices[start:end] - prices[a]) -
+                      (x[a] - x[start:end]) * (average_y - prices[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+
+    return times[selected], prices[selected]
@@ -0,0 +1,87 @@
+import math
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+PAGE_SIZE = 11
+OPTIONS = ("price", "chart", "favorites-add")
+
+
+def get_keyboard(data, cryptocurrencies, option):
+    keyboard = []
+    keyboard_layer = []
+
+    for i in range(len(cryptocurrencies[:10])):
+        asset = data.by_id(cryptocurrencies[i])
+        keyboard_layer.append(InlineKeyboardButton(asset.symbol if asset else cryptocurrencies[i],
+                                                   callback_data=f"{option}_{cryptocurrencies[i]}"))
+        if i == 4:
+            keyboard.append(keyboard_layer)
+            keyboard_layer = []
+    keyboard.append(keyboard_layer)
+
+    return keyboard
+
+
+def get_page(data, cryptocurrencies, option, start: int, end: int):
+    keyboard = get_keyboard(data, cryptocurrencies[start:end], option)
+
+    if len(cryptocurrencies) <= end and not start:
+        keyboard.append([InlineKeyboardButton("🏠 Home", callback_data="home")])
+    elif len(cryptocurrencies) <= end:
+        keyboard.append(
+            [InlineKeyboardButton("◀ Back", callback_data=f"{option}#{start - PAGE_SIZE}-{start}"),
+             InlineKeyboardButton("🔍 Search", callback_data="search"),
+             InlineKeyboardButton("🏠 Home", callback_data="home")]
+        )
+    elif start > 0:
+        keyboard.append(
+            [InlineKeyboardButton("◀ Back", callback_data=f"{option}#{start - PAGE_SIZE}-{start}"),
+             InlineKeyboardButton("🔍 Search", callback_data="search"),
+             InlineKeyboardButton("🏠 Home", callback_data="home"),
+             InlineKeyboardButton("▶ Next", callback_data=f"{option}#{end}-{end + PAGE_SIZE}")]
+        )
+    else:
+        keyboard.append(
+            [InlineKeyboardButton("🔍 Search", callback_data="search"),
+             InlineKeyboardButton("🏠 Home", callback_data="home"),
+             InlineKeyboardButton("▶ Next", callback_data=f"{option}#{end}-{end + PAGE_SIZE}")])
+
+    return keyboard
+
+
+def parse_page(callback_data: str):
+    option, offsets = callback_data.split("#")
+    start, end = offsets.split("-")
+    return option, int(start), int(end)
+
+
+class Pages:
+    def __init__(self, options: tuple):
+        self.options = options
+        self.market, self.ranking = None, None
+        self.version = 0
+        self.pages = {}
+
+    def get(self, data, option: str, start: int, end: int) -> InlineKeyboardMarkup:
+        if data is not self.market:
+            self.update(data)
+
+        page = self.pages.get((option, start // PAGE_SIZE))
+        if page is None or start % PAGE_SIZE or end - start != PAGE_SIZE:
+            return InlineKeyboardMarkup(get_page(data, data.ids, option, start, end))
+        return page
+
+    def update(self, data):
+        self.market = data
+        if data.ids != self.ranking:
+            self.build(data)
+
+    def build(self, data):
+        self.ranking = data.ids
+        self.version += 1
+        self.pages = {(option, page): InlineKeyboardMarkup(get_page(data, data.ids, option,
+                                                                    page * PAGE_SIZE, (page + 1) * PAGE_SIZE))
+                      for option in self.options for page in range(math.ceil(len(data.ids) / PAGE_SIZE))}
+
+
+pages = Pages(OPTIONS)
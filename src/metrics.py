@@ -0,0 +1,213 @@
+import os
+import sys
+import time
+import bisect
+import asyncio
+import threading
+import functools
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_FILE = os.environ.get("METRICS_FILE", "")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.01))
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum, self.count = 0.0, 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        rank, seen = q * self.count, 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return 0.0
+
+
+histograms, counters, gauges = {}, Counter(), {}
+lock = threading.Lock()
+
+
+def get_key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name: str, value: float, **labels):
+    key = get_key(name, labels)
+    with lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram()
+        histogram.observe(value)
+
+
+def count(name: str, value: int = 1, **labels):
+    with lock:
+        counters[get_key(name, labels)] += value
+
+
+def gauge(name: str, get_value, **labels):
+    with lock:
+        gauges[get_key(name, labels)] = get_value
+
+
+class timer:
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name: str, **labels):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+        if error_type is not None:
+            count(f"{self.name.removesuffix('_seconds')}_errors_total", **self.labels)
+
+
+def timed(name: str, **labels):
+    def decorator(function):
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with timer(name, **labels):
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with timer(name, **labels):
+                    return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def format_labels(labels: tuple, extra: tuple = ()) -> str:
+    labels = labels + extra
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}" if labels else ""
+
+
+def copy(histogram: Histogram) -> Histogram:
+    result = Histogram()
+    result.counts, result.sum, result.count = list(histogram.counts), histogram.sum, histogram.count
+    return result
+
+
+def snapshot() -> tuple:
+    with lock:
+        return (sorted((key, copy(histogram)) for key, histogram in histograms.items()),
+                sorted(counters.items()), sorted(gauges.items()))
+
+
+def render() -> str:
+    lines = []
+    histogram_items, counter_items, gauge_items = snapshot()
+    for (name, labels), histogram in histogram_items:
+        total = 0
+        for bucket, bucket_count in zip(BUCKETS + ("+Inf",), histogram.counts):
+            total += bucket_count
+            lines.append(f"{name}_bucket{format_labels(labels, (('le', bucket),))} {total}")
+        lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+    for (name, labels), value in counter_items:
+        lines.append(f"{name}{format_labels(labels)} {value}")
+    for (name, labels), get_value in gauge_items:
+        lines.append(f"{name}{format_labels(labels)} {get_value()}")
+    return "\n".join(lines) + "\n"
+
+
+def summary() -> str:
+    lines = []
+    histogram_items, counter_items, gauge_items = snapshot()
+    for (name, labels), histogram in histogram_items:
+        label = ",".join(str(value) for _, value in labels)
+        lines.append(f"{name.removesuffix('_seconds')}[{label}] n={histogram.count} "
+                     f"avg={histogram.sum / histogram.count * 1000:.1f}ms "
+                     f"p50<={histogram.quantile(0.5) * 1000:g}ms p95<={histogram.quantile(0.95) * 1000:g}ms")
+    for (name, labels), value in counter_items:
+        lines.append(f"{name}{format_labels(labels)} {value}")
+    for (name, labels), get_value in gauge_items:
+        lines.append(f"{name}{format_labels(labels)} {get_value()}")
+    return "\n".join(lines)
+
+
+def write(path: str = METRICS_FILE):
+    with open(f"{path}.tmp", "w") as file:
+        file.write(render())
+    os.replace(f"{path}.tmp", path)
+
+
+def serve(port: int = METRICS_PORT) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Profiler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = Counter()
+        self.lock = threading.Lock()
+        self.thread, self.target = None, None
+        self.running = False
+
+    def start(self, thread_id: int = None):
+        if self.running:
+            return
+        self.running, self.target = True, thread_id or threading.main_thread().ident
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None and len(stack) < 32:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                with self.lock:
+                    self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def top(self, limit: int = 10) -> str:
+        with self.lock:
+            items = list(self.samples.items())
+        total = sum(samples for _, samples in items) or 1
+        leaves = Counter()
+        for stack, samples in items:
+            leaves[stack.rsplit(";", 1)[-1]] += samples
+        return "\n".join(f"{samples / total * 100:5.1f}% {leaf}" for leaf, samples in leaves.most_common(limit))
+
+
+profiler = Profiler(PROFILE_INTERVAL)
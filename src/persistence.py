@@ -0,0 +1,75 @@
+import os
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from database import UserData
+
+PERSISTENCE_INTERVAL = float(os.environ.get("PERSISTENCE_INTERVAL", 10))
+USER_DATA_TTL = float(os.environ.get("USER_DATA_TTL", 60))
+
+
+class DatabasePersistence(BasePersistence):
+    def __init__(self, update_interval: float = PERSISTENCE_INTERVAL, ttl: float = USER_DATA_TTL):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True,
+                                                     callback_data=False),
+                         update_interval=update_interval)
+        self.ttl = max(ttl, 2 * update_interval)
+        self.loaded = {}
+
+    async def get_user_data(self) -> dict:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        now, seen = time.monotonic(), self.loaded.get(user_id)
+        self.loaded[user_id] = now
+        if seen is None:
+            user_data.update({**await UserData.get(user_id), **user_data})
+        elif now - seen > self.ttl:
+            stored = await UserData.get(user_id)
+            user_data.clear()
+            user_data.update(stored)
+
+    async def update_user_data(self, user_id: int, data: dict):
+        self.loaded.setdefault(user_id, time.monotonic())
+        await UserData.set(user_id, data)
+
+    async def drop_user_data(self, user_id: int):
+        self.loaded.pop(user_id, None)
+        await UserData.remove(user_id)
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name: str, key: tuple, new_state):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def flush(self):
+        pass
@@ -0,0 +1,92 @@
+import io
+import os
+import math
+import uuid
+import datetime
+import functools
+
+import numpy as np
+
+from PIL import Image, ImageDraw, ImageFont
+
+WIDTH, HEIGHT = 1280, 720
+LEFT, RIGHT, TOP, BOTTOM = 90, 40, 25, 45
+
+BACKGROUND, FOREGROUND = '#181526', '#D2D3D9'
+FALLING, RISING = '#a67b77', '#87a677'
+
+FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'assets', 'Ruberoid-Medium.ttf')
+
+
+def get_chart(dates: np.ndarray, prices: np.ndarray, in_memory: bool = False):
+    image = make_chart(dates, prices)
+
+    if in_memory:
+        buffer = io.BytesIO()
+        image.save(buffer, format='WEBP', quality=90)
+        return buffer.getvalue()
+
+    file_name = str(uuid.uuid4())
+    image.save(f'images/{file_name}.webp', format='WEBP', quality=90)
+
+    return file_name
+
+
+def warm_up():
+    make_chart(np.array(['2023-01-01', '2023-01-02'], dtype='datetime64[ms]'), np.array([1.0, 2.0]))
+
+
+@functools.lru_cache(maxsize=None)
+def get_font(size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(FONT, size)
+
+
+def make_chart(dates: np.ndarray, prices: np.ndarray) -> Image.Image:
+    times = dates.astype('datetime64[ms]').astype(np.int64)
+    first, last = prices[0], prices[-1]
+    low, high = prices.min(), prices.max()
+    if high == low:
+        low, high = low - 1, high + 1
+
+    start, span = times[0], (times[-1] - times[0]) or 1
+    left, right, top, bottom = LEFT, WIDTH - RIGHT, TOP, HEIGHT - BOTTOM
+
+    def y(value: float) -> float:
+        return bottom - (value - low) / (high - low) * (bottom - top)
+
+    image = Image.new('RGB', (WIDTH, HEIGHT), BACKGROUND)
+    draw = ImageDraw.Draw(image, 'RGBA')
+    font = get_font(14)
+
+    step = nice_step((high - low) / 6)
+    decimals = max(0, -math.floor(math.log10(step)))
+    tick = math.ceil(low / step) * step
+    while tick <= high:
+        draw.line([(left, y(tick)), (right, y(tick))], fill=FOREGROUND, width=1)
+        draw.text((left - 8, y(tick)), f"${tick:,.{decimals}f}", fill=FOREGROUND, font=font, anchor='rm')
+        tick += step
+
+    color = FALLING if first > last else RISING
+    xs = left + (times - start) / span * (right - left)
+    points = list(zip(xs.tolist(), y(prices).tolist()))
+    draw.polygon(points + [(points[-1][0], bottom), (points[0][0], bottom)], fill=color + '80')
+    draw.line(points, fill=color, width=2, joint='curve')
+
+    days = max(1, math.ceil(span / 86400000 / 8))
+    for day in np.arange(dates[0].astype('datetime64[D]') + 1, dates[-1], np.timedelta64(days, 'D')):
+        x = left + (day.astype('datetime64[ms]').astype(np.int64) - start) / span * (right - left)
+        draw.text((x, bottom + 10), day.astype(datetime.date).strftime('%b %d'), fill=FOREGROUND, font=font,
+                  anchor='mt')
+
+    for dash in range(left, right, 8):
+        draw.line([(dash, y(last)), (min(dash + 3, right), y(last))], fill=FOREGROUND, width=1)
+    draw.text((right, y(last) - 4), f"${'{:,}'.format(last)}", fill=FOREGROUND, font=font, anchor='rb')
+
+    return image
+
+
+def nice_step(rough: float) -> float:
+    magnitude = 10 ** math.floor(math.log10(rough))
+    for multiple in (1, 2, 5, 10):
+        if multiple * magnitude >= rough:
+            return multiple * magnitude
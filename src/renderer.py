@@ -0,0 +1,60 @@
+import os
+import asyncio
+import importlib
+import multiprocessing
+
+import metrics
+
+from concurrent.futures import ProcessPoolExecutor
+
+CHART_WORKERS = int(os.environ.get("CHART_WORKERS", os.cpu_count() or 1))
+CHART_QUEUE_SIZE = int(os.environ.get("CHART_QUEUE_SIZE", 16))
+CHART_IN_MEMORY = os.environ.get("CHART_IN_MEMORY", "1") == "1"
+CHART_ENGINE = os.environ.get("CHART_ENGINE", "plotly")
+
+ENGINES = {"plotly": "chart", "raster": "raster"}
+
+pool = None
+slots = None
+
+
+def get_engine(name: str = CHART_ENGINE):
+    return importlib.import_module(ENGINES[name])
+
+
+def warm_up():
+    get_engine().warm_up()
+
+
+def render(time, price):
+    return get_engine().get_chart(time, price, in_memory=CHART_IN_MEMORY)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global pool
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=CHART_WORKERS,
+                                   mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=warm_up)
+    return pool
+
+
+def start():
+    get_pool().submit(os.getpid)
+
+
+@metrics.timed("chart_render_seconds", engine=CHART_ENGINE)
+async def get_chart(time, price):
+    global slots
+    if slots is None:
+        slots = asyncio.Semaphore(CHART_WORKERS + CHART_QUEUE_SIZE)
+    if slots.locked():
+        raise asyncio.QueueFull()
+
+    async with slots:
+        return await asyncio.get_running_loop().run_in_executor(get_pool(), render, time, price)
+
+
+def shutdown():
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
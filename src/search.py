@@ -0,0 +1,83 @@
+import bisect
+
+EXACT, PREFIX, FUZZY = 0, 1, 2
+MAX_FUZZY_LENGTH = 24
+
+
+class SearchIndex:
+    def __init__(self, data):
+        self.rows = {}
+        for i in range(len(data)):
+            for key in (data.symbols[i], data.ids[i], data.names[i]):
+                self.rows.setdefault(key.lower(), []).append(i)
+
+        self.keys = sorted(self.rows)
+        self.deletes = {}
+        for key in self.keys:
+            for variant in get_deletes(key):
+                self.deletes.setdefault(variant, set()).add(key)
+
+    def search(self, text: str, limit: int = 10) -> list:
+        query = text.strip().lstrip("$").lower()
+        if not query:
+            return []
+
+        scores = {}
+
+        def score(key: str, value: int):
+            for i in self.rows[key]:
+                if scores.get(i, (FUZZY + 1,))[0] > value:
+                    scores[i] = (value, i)
+
+        if query in self.rows:
+            score(query, EXACT)
+
+        for key in self.keys[bisect.bisect_left(self.keys, query):]:
+            if not key.startswith(query):
+                break
+            score(key, PREFIX)
+
+        if len(scores) < limit and len(query) <= MAX_FUZZY_LENGTH:
+            for key in self.get_fuzzy(query):
+                score(key, FUZZY)
+
+        return [i for _, i in sorted(scores.values())[:limit]]
+
+    def get_fuzzy(self, query: str) -> set:
+        candidates = set(self.deletes.get(query, ()))
+        for variant in get_deletes(query):
+            if variant in self.rows:
+                candidates.add(variant)
+            candidates.update(self.deletes.get(variant, ()))
+        return {key for key in candidates if get_distance(query, key) <= 1}
+
+
+def get_deletes(word: str) -> set:
+    if len(word) > MAX_FUZZY_LENGTH or len(word) < 2:
+        return set()
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def get_distance(a: str, b: str) -> int:
+    if abs(len(a) - len(b)) > 1:
+        return 2
+
+    rows = [list(range(len(b) + 1))]
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            row[j] = min(rows[-1][j] + 1, row[j - 1] + 1, rows[-1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], rows[-2][j - 2] + 1)
+        rows.append(row)
+    return rows[-1][-1]
+
+
+index, indexed = None, None
+
+
+def get_index(data) -> SearchIndex:
+    global index, indexed
+    if data is not indexed:
+        index, indexed = SearchIndex(data), data
+    return index
@@ -0,0 +1,67 @@
+import os
+import time
+import asyncio
+import logging
+
+import metrics
+
+from telegram.error import Forbidden, RetryAfter, TelegramError
+
+SEND_RATE = float(os.environ.get("SEND_RATE", 25))
+
+logger = logging.getLogger(__name__)
+
+
+class SendQueue:
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.queue = asyncio.Queue()
+        self.task = None
+        self.sent, self.failed = 0, 0
+
+    def start(self, bot):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(bot))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def put(self, chat_id: int, text: str, **kwargs):
+        await self.queue.put({'chat_id': chat_id, 'text': text, **kwargs})
+
+    async def join(self):
+        await self.queue.join()
+
+    async def run(self, bot):
+        next_send = time.monotonic()
+        while True:
+            message = await self.queue.get()
+            try:
+                while True:
+                    await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+                    next_send = max(next_send, time.monotonic()) + self.interval
+                    try:
+                        await bot.send_message(**message)
+                        self.sent += 1
+                        break
+                    except RetryAfter as e:
+                        next_send = time.monotonic() + e.retry_after
+            except Forbidden:
+                self.failed += 1
+            except TelegramError as e:
+                self.failed += 1
+                logger.warning("Failed to send message to %s: %s", message['chat_id'], e)
+            finally:
+                self.queue.task_done()
+
+
+queue = SendQueue(SEND_RATE)
+metrics.gauge("review_messages_total", lambda: queue.sent, result="sent")
+metrics.gauge("review_messages_total", lambda: queue.failed, result="failed")
+metrics.gauge("review_queue_size", lambda: queue.queue.qsize())
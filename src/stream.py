@@ -0,0 +1,79 @@
+import os
+import json
+import asyncio
+import logging
+
+import websockets
+
+import crypto
+
+PRICE_STREAM = os.environ.get("PRICE_STREAM", "0") == "1"
+PRICE_STREAM_URL = os.environ.get("PRICE_STREAM_URL", "wss://ws.coincap.io/prices?assets=ALL")
+STREAM_BACKOFF = float(os.environ.get("STREAM_BACKOFF", 1))
+STREAM_MAX_BACKOFF = float(os.environ.get("STREAM_MAX_BACKOFF", 60))
+POLL_INTERVAL = float(os.environ.get("POLL_INTERVAL", crypto.SNAPSHOT_TTL))
+
+logger = logging.getLogger(__name__)
+
+
+class PriceStream:
+    def __init__(self, url: str):
+        self.url = url
+        self.connected = False
+        self.task, self.poller = None, None
+        self.updates, self.reconnects = 0, 0
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        for task in (self.task, self.poller):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.task, self.poller = None, None
+
+    async def run(self):
+        delay = STREAM_BACKOFF
+        while True:
+            try:
+                async with websockets.connect(self.url) as socket:
+                    self.connected, delay = True, STREAM_BACKOFF
+                    crypto.snapshot.set_streaming(True)
+                    self.stop_polling()
+                    async for message in socket:
+                        self.apply(json.loads(message))
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException, ValueError) as e:
+                logger.warning("Price stream is down: %r", e)
+            finally:
+                self.connected = False
+                crypto.snapshot.set_streaming(False)
+
+            self.start_polling()
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, STREAM_MAX_BACKOFF)
+
+    def apply(self, prices: dict):
+        self.updates += crypto.snapshot.set_prices({coin_id: float(price) for coin_id, price in prices.items()})
+
+    def start_polling(self):
+        if self.poller is None:
+            self.poller = asyncio.create_task(self.poll())
+
+    def stop_polling(self):
+        if self.poller is not None:
+            self.poller.cancel()
+            self.poller = None
+
+    async def poll(self):
+        while True:
+            crypto.snapshot.refresh_in_background()
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+stream = PriceStream(PRICE_STREAM_URL)
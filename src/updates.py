@@ -0,0 +1,71 @@
+import os
+import sys
+import asyncio
+import contextlib
+
+from collections import Counter
+
+from telegram import Update
+from telegram.ext import Application
+
+import metrics
+
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", 256))
+CHART_CONCURRENCY = int(os.environ.get("CHART_CONCURRENCY", 8))
+TEXT_CONCURRENCY = int(os.environ.get("TEXT_CONCURRENCY", 64))
+UNBOUNDED = sys.maxsize
+
+LIMITS = {"charts": CHART_CONCURRENCY, "text": TEXT_CONCURRENCY}
+
+
+class UserLocks:
+    def __init__(self):
+        self.locks = {}
+        self.users = Counter()
+
+    def __len__(self):
+        return len(self.locks)
+
+    @contextlib.asynccontextmanager
+    async def hold(self, user_id: int):
+        lock = self.locks.setdefault(user_id, asyncio.Lock())
+        self.users[user_id] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self.users[user_id] -= 1
+            if not self.users[user_id]:
+                del self.users[user_id], self.locks[user_id]
+
+
+user_locks = UserLocks()
+slots, active = {}, Counter()
+metrics.gauge("user_locks", lambda: len(user_locks))
+for kind in LIMITS:
+    metrics.gauge("updates_active", lambda kind=kind: active[kind], kind=kind)
+
+
+def get_slots(kind: str) -> asyncio.Semaphore:
+    if kind not in slots:
+        slots[kind] = asyncio.Semaphore(LIMITS.get(kind, UPDATE_CONCURRENCY))
+    return slots[kind]
+
+
+def get_kind(update: object) -> str:
+    if isinstance(update, Update) and update.callback_query and update.callback_query.data:
+        if update.callback_query.data.split("_")[0] == "chart":
+            return "charts"
+    return "text"
+
+
+class ConcurrentApplication(Application):
+    async def process_update(self, update: object):
+        user = update.effective_user if isinstance(update, Update) else None
+        kind = get_kind(update)
+        async with user_locks.hold(user.id if user else None), get_slots(kind), get_slots("updates"):
+            active[kind] += 1
+            try:
+                await super().process_update(update)
+            finally:
+                active[kind] -= 1
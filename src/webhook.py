@@ -0,0 +1,136 @@
+import os
+import json
+import signal
+import asyncio
+import logging
+import threading
+import multiprocessing
+import urllib.parse
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8443))
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", os.cpu_count() or 1))
+WEBHOOK_QUEUE_SIZE = int(os.environ.get("WEBHOOK_QUEUE_SIZE", 1000))
+
+logger = logging.getLogger(__name__)
+
+
+def get_user_id(data: dict) -> int:
+    for value in data.values():
+        if isinstance(value, dict):
+            user = value.get("from") or value.get("user") or value.get("chat")
+            if user:
+                return user["id"]
+    return 0
+
+
+def work(index: int, updates):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ.setdefault("CHART_WORKERS", str(max(1, (os.cpu_count() or 1) // WEBHOOK_WORKERS)))
+
+    import metrics
+    if metrics.METRICS_PORT:
+        metrics.METRICS_PORT += index
+    if metrics.METRICS_FILE:
+        metrics.METRICS_FILE = f"{metrics.METRICS_FILE}.{index}"
+
+    asyncio.run(serve(index, updates))
+
+
+async def serve(index: int, updates):
+    from telegram import Update
+    from bot import build_app
+
+    app = build_app(alarms=index == 0, prewarm=index == 0)
+    await app.initialize()
+    await app.post_init(app)
+    await app.start()
+    logger.info("Webhook worker %d started", index)
+
+    while (data := await asyncio.to_thread(updates.get)) is not None:
+        await app.update_queue.put(Update.de_json(data, app.bot))
+
+    await app.stop()
+    await app.shutdown()
+    await app.post_shutdown(app)
+
+
+def set_webhook():
+    from telegram import Bot, Update
+    from bot import BOT_API_URL
+
+    async def request():
+        async with Bot(os.environ.get("BOT_TOKEN"), base_url=BOT_API_URL) as bot:
+            await bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET or None,
+                                  allowed_updates=Update.ALL_TYPES)
+
+    asyncio.run(request())
+
+
+def get_server(queues: list) -> ThreadingHTTPServer:
+    path = urllib.parse.urlsplit(WEBHOOK_URL).path or "/"
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path != path:
+                return self.reply(404)
+            if WEBHOOK_SECRET and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+                return self.reply(403)
+            try:
+                data = json.loads(body)
+            except ValueError:
+                return self.reply(400)
+
+            queues[get_user_id(data) % len(queues)].put(data)
+            self.reply(200)
+
+        def reply(self, status: int):
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((WEBHOOK_LISTEN, WEBHOOK_PORT), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    from database import create_db
+
+    create_db()
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue(WEBHOOK_QUEUE_SIZE) for _ in range(WEBHOOK_WORKERS)]
+    workers = [context.Process(target=work, args=(index, queue), name=f"webhook-worker-{index}")
+               for index, queue in enumerate(queues)]
+    for worker in workers:
+        worker.start()
+
+    server = get_server(queues)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    if WEBHOOK_URL.startswith("https://"):
+        set_webhook()
+    logger.info("Serving webhook on %s:%d with %d workers", WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_WORKERS)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for queue in queues:
+            queue.put(None)
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='cryptifica-tests-')}/rollups.db"
+
+import crypto
+import database
+
+from crypto import DAY, HOUR, MINUTE, RANGES, RETENTION, TIERS
+from database import Rollups
+
+START = 1_700_000_000_000
+
+
+class Market:
+    def __init__(self):
+        self.now = START
+        self.calls = []
+
+    def time(self) -> float:
+        return self.now / 1000
+
+    async def fetch(self, path: str, interval: str, start: int = None, end: int = None) -> list:
+        self.calls.append((interval, start is not None))
+        step, end = TIERS[interval], end or self.now
+        first = -(-start // step) * step if start is not None else (START - 3 * 365 * DAY) // step * step
+        return [{"priceUsd": str(100 + time_ms // MINUTE % 97), "time": time_ms}
+                for time_ms in range(first, end + 1, step)]
+
+
+def run(monkeypatch, scenario):
+    market = Market()
+    monkeypatch.setattr(crypto, "fetch", market.fetch)
+    monkeypatch.setattr(crypto, "time", SimpleNamespace(time=market.time, monotonic=time.monotonic))
+    monkeypatch.setattr(crypto, "history_checked", {})
+    monkeypatch.setattr(crypto, "history_locks", {})
+    database.create_db()
+
+    async def main():
+        try:
+            await scenario(market)
+        finally:
+            await database.async_engine.dispose()
+
+    asyncio.run(main())
+
+
+async def check(coin_id: str, tier: str, now: int):
+    for name, step in TIERS.items():
+        times = [row[0] for row in await Rollups.get(coin_id, name)]
+        if not times:
+            continue
+        assert all(later - earlier == step for earlier, later in zip(times, times[1:])), f"gap in {name}"
+        if RETENTION[name]:
+            assert times[0] <= now - RETENTION[name] + step, f"{name} does not cover its retention"
+        if list(TIERS).index(name) <= list(TIERS).index(tier):
+            assert now - times[-1] < 2 * step, f"{name} is behind"
+
+
+def test_idle_longer_than_retention(monkeypatch):
+    async def scenario(market):
+        await crypto.update_history("idle", "h1")
+        market.now += 5 * DAY
+        await crypto.update_history("idle", "h1")
+        await check("idle", "h1", market.now)
+        assert ("h1", True) in market.calls[2:]
+        assert len(await Rollups.get("idle", "h1", market.now - 7 * DAY)) == 168
+
+    run(monkeypatch, scenario)
+
+
+def test_no_gaps_after_random_requests(monkeypatch):
+    rng = random.Random(22)
+
+    async def scenario(market):
+        for _ in range(40):
+            market.now += rng.choice([MINUTE, 7 * MINUTE, HOUR, 5 * HOUR, DAY, 3 * DAY, 40 * DAY])
+            market.now += rng.randrange(HOUR)
+            tier = RANGES[rng.choice(list(RANGES))][0]
+            await crypto.update_history("random", tier)
+            await check("random", tier, market.now)
+
+    run(monkeypatch, scenario)